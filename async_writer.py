@@ -0,0 +1,257 @@
+import asyncio
+import functools
+import json
+import time
+
+import aiohttp
+
+from client import RETRY_STATUS, estimate_tokens
+from core import AIDocWriter
+
+
+class AsyncAIDocWriter:
+    """
+    AIDocWriter的asyncio版本：补全请求走aiohttp非阻塞连接池，
+    python-docx构建与保存放到线程池执行，便于在同一事件循环中并发驱动多个生成任务
+    配置多后端路由时每个请求按路由的代价排序选择后端并依次故障转移（异步路径不做对冲），
+    请求计数、耗时与token用量的记录与同步客户端一致
+    Args:
+        writer: 复用配置、缓存与模板缓存的AIDocWriter实例，为空时新建
+        max_in_flight: 同时进行中的补全请求上限
+        executor: 文档构建使用的执行器，为空时使用事件循环默认线程池
+    """
+
+    def __init__(self, writer=None, max_in_flight=8, executor=None):
+        self.writer = writer or AIDocWriter()
+        self.executor = executor
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._inflight = {}
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    @property
+    def client(self):
+        # 单后端时为AIDocWriter的客户端，多后端路由时为当前最优后端的客户端
+        return getattr(self.writer.client, 'primary', self.writer.client)
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            # 各后端的认证头与超时不同，按请求传入；连接数上限按各后端连接池之和
+            backends = getattr(self.writer.client, 'backends', None)
+            limit = sum(b.client.pool_size for b in backends) if backends else self.writer.client.pool_size
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=limit))
+        return self._session
+
+    @staticmethod
+    async def _acquire_limits(client, payload):
+        for bucket, amount in ((client.request_bucket, 1),
+                               (client.token_bucket, client._prompt_tokens(payload))):
+            while True:
+                wait = bucket.try_acquire(amount)
+                if not wait:
+                    break
+                await asyncio.sleep(wait)
+
+    async def _post(self, payload, kind='chat'):
+        """
+        发出补全请求，返回(所用客户端, 状态码正常的响应)
+        多后端路由时按路由的代价排序依次尝试，并记录各后端的延迟与成败，供同步与异步路径共同排序
+        """
+        router = self.writer.client
+        if not hasattr(router, 'rank'):
+            return router, await self._timed_post(router, payload)
+        error = None
+        for attempt, backend in enumerate(router.rank(kind)[:router.max_attempts]):
+            if attempt:
+                router._record('router_failovers')
+            try:
+                with backend.tracking(kind, router.cooldown, router.max_failures):
+                    return backend.client, await self._timed_post(backend.client, backend.payload_for(payload))
+            except Exception as e:
+                error = e
+                print(f"后端{backend.name}请求失败: {e}")
+        raise error
+
+    async def _timed_post(self, client, payload):
+        # 与CompletionClient._timed_post一致：记录请求数、最终失败数与请求耗时
+        client._record('requests')
+        start = time.perf_counter()
+        try:
+            return await self._send(client, payload)
+        except Exception:
+            client._record('request_errors')
+            raise
+        finally:
+            if client.metrics is not None:
+                client.metrics.observe('request', time.perf_counter() - start)
+
+    async def _send(self, client, payload):
+        # 与CompletionClient.post一致的重试语义：429/5xx与网络错误按指数退避重试
+        await self._acquire_limits(client, payload)
+        session = self._get_session()
+        url = f"{client.api_base}/chat/completions"
+        connect_timeout, read_timeout = client.timeout
+        options = dict(json=payload, headers=dict(client.session.headers),
+                       timeout=aiohttp.ClientTimeout(connect=connect_timeout, sock_read=read_timeout))
+        attempt = 0
+        while True:
+            try:
+                response = await session.post(url, **options)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= client.max_retries:
+                    raise
+                client._record('request_retries')
+                await asyncio.sleep(client.retry_delay(attempt))
+                attempt += 1
+                continue
+
+            if response.status in RETRY_STATUS and attempt < client.max_retries:
+                delay = client.retry_delay(attempt, response.headers.get('Retry-After'))
+                response.release()
+                client._record('request_retries')
+                print(f"API返回{response.status}，{delay:.1f}秒后第{attempt + 1}次重试")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            response.raise_for_status()
+            return response
+
+    async def agenerate_content(self, prompt, use_cache=True, rule_set=None, use_similar=True):
+        """
+        异步生成内容，语义与AIDocWriter.generate_content相同，失败时返回None
+        任务被取消时会中断进行中的HTTP请求并向上抛出CancelledError
+        """
+        payload = self.writer._build_payload(prompt)
+        key = self.writer._cache_key(payload)
+        prompt = self.writer.coalescer.normalize(prompt)
+        scope = self.writer._coalesce_scope(payload)
+        content = None
+        if use_cache:
+            content = self.writer.cache.get(key)
+            if content is None and use_similar:
+                content = self.writer.coalescer.similar(prompt, scope)
+        if content is None:
+            try:
+                content = await self._coalesced_fetch(key, payload)
+                self.writer.coalescer.remember(prompt, content, scope)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"API请求失败: {e}")
+                return None
+        return self.writer.get_filter(rule_set).filter(content)
+
+    async def _coalesced_fetch(self, key, payload):
+        # 同一事件循环中相同的进行中请求只发出一次；所有等待者都取消后才中断请求
+        entry = self._inflight.get(key)
+        if entry is None:
+            entry = self._inflight[key] = {'task': asyncio.ensure_future(self._fetch(key, payload)), 'waiters': 0}
+            entry['task'].add_done_callback(
+                lambda _: self._inflight.pop(key, None) if self._inflight.get(key) is entry else None)
+        else:
+            self.writer.metrics.incr('coalesced_inflight')
+        entry['waiters'] += 1
+        try:
+            return await asyncio.shield(entry['task'])
+        except asyncio.CancelledError:
+            entry['waiters'] -= 1
+            if not entry['waiters']:
+                entry['task'].cancel()
+            raise
+
+    async def _fetch(self, key, payload):
+        async with self._semaphore:
+            client, response = await self._post(payload)
+            async with response:
+                data = await response.json(content_type=None)
+        content = data['choices'][0]['message']['content']
+        usage = data.get('usage') or {}
+        client.token_bucket.consume(usage.get('completion_tokens', 0))
+        client._record('tokens_in', usage.get('prompt_tokens') or client._prompt_tokens(payload))
+        client._record('tokens_out', usage.get('completion_tokens') or estimate_tokens(content))
+        self.writer.cache.set(key, content)
+        return content
+
+    async def agenerate_content_stream(self, prompt, use_cache=True, rule_set=None):
+        """
+        异步流式生成，按段落逐个产出过滤后的文本
+        """
+        content_filter = self.writer.get_filter(rule_set)
+        payload = self.writer._build_payload(prompt)
+        key = self.writer._cache_key(payload)
+        content = self.writer.cache.get(key) if use_cache else None
+        if content is not None:
+            for line in content_filter.filter_stream([content]):
+                yield line
+            return
+
+        completion = []
+        # 增量过滤，段落与非流式路径filter()后按行拆分的结果一致
+        stream_filter = content_filter.stream()
+        async with self._semaphore:
+            try:
+                client, response = await self._post(dict(payload, stream=True), kind='stream')
+                client._record('tokens_in', client._prompt_tokens(payload))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"API请求失败: {e}")
+                raise RuntimeError("流式请求失败，请检查API配置") from e
+            async with response:
+                async for raw in response.content:
+                    line = raw.decode('utf-8').strip()
+                    if not line.startswith('data:'):
+                        continue
+                    data = line[len('data:'):].strip()
+                    if data == '[DONE]':
+                        break
+                    choices = json.loads(data).get('choices') or []
+                    delta = choices[0].get('delta', {}).get('content') if choices else None
+                    if not delta:
+                        continue
+                    completion.append(delta)
+                    for paragraph in stream_filter.feed(delta):
+                        yield paragraph
+        for paragraph in stream_filter.close():
+            yield paragraph
+        content = ''.join(completion)
+        tokens = estimate_tokens(content)
+        client.token_bucket.consume(tokens)
+        client._record('tokens_out', tokens)
+        self.writer.cache.set(key, content)
+
+    def _create_document(self, content, filename, **kwargs):
+        # 开启[Output] background_io时create_document返回后文件可能尚未写完，在执行器线程中等待写盘完成
+        filename = self.writer.create_document(content, filename, **kwargs)
+        self.writer.output.wait(filename)
+        return filename
+
+    async def acreate_document(self, content, filename, **kwargs):
+        """
+        在执行器中构建并保存文档，文件写盘完成后返回实际保存的文件名，写盘失败时抛出对应异常
+        取消只会停止等待，已开始执行的构建会在后台完成
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(self._create_document, content, filename, **kwargs)
+        )
+
+    async def agenerate_document(self, prompt, filename, use_cache=True, rule_set=None, **kwargs):
+        """
+        生成内容并构建文档，API返回空内容时抛出RuntimeError
+        """
+        content = await self.agenerate_content(prompt, use_cache=use_cache, rule_set=rule_set)
+        if not content:
+            raise RuntimeError('API返回空内容')
+        return await self.acreate_document(content, filename, **kwargs)
+
+    async def aclose(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
@@ -0,0 +1,331 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from jobqueue import JobQueue
+from longdoc import SectionedGenerator
+from core import AIDocWriter
+from metrics import Profiler, maybe_profile, percentile
+from packing import PromptPacker
+from render import RenderPool
+
+BOOL_FIELDS = ('bold', 'italic', 'spacing_enabled', 'sectioned', 'streaming')
+DOC_FIELDS = ('font_name', 'font_size', 'bold', 'italic', 'template', 'spacing_enabled', 'streaming')
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y', 'on')
+
+
+def load_manifest(path):
+    """
+    读取批量任务清单，支持JSONL与CSV两种格式
+    可选字段: output, font_name, font_size, template, spacing_enabled, bold, italic, rule_set,
+    sectioned（为真时按大纲分章节并行生成长文档）, streaming（为真时流式写入大文档）
+    Args:
+        path: 清单文件路径
+    Returns:
+        任务字典列表，每项至少包含prompt字段
+    """
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        if path.lower().endswith('.csv'):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    items = []
+    for index, row in enumerate(rows):
+        if not row.get('prompt'):
+            raise ValueError(f'清单第{index + 1}项缺少prompt字段')
+        item = {key: value for key, value in row.items() if value not in (None, '')}
+        for key in BOOL_FIELDS:
+            if key in item:
+                item[key] = _to_bool(item[key])
+        item.setdefault('output', f'document_{index + 1}.docx')
+        items.append(item)
+    return items
+
+
+class BatchRunner:
+    """
+    无界面批量生成器，在有界线程池中并发执行generate_content与create_document
+    Args:
+        writer: AIDocWriter实例
+        output_dir: 输出目录
+        concurrency: 最大并发任务数
+        retries: 单项失败后的重试次数
+        retry_delay: 重试基础间隔（秒），按尝试次数线性递增
+        renderer: 可选的RenderPool，文档构建与保存在子进程中执行，为空时在当前线程执行
+        packer: 可选的PromptPacker，短文档按token预算合并为一个请求，拆分失败的改为单独请求
+    """
+
+    def __init__(self, writer, output_dir='.', concurrency=4, retries=2, retry_delay=1.0, renderer=None,
+                 packer=None):
+        self.writer = writer
+        self.output_dir = output_dir
+        self.concurrency = max(1, concurrency)
+        self.retries = max(0, retries)
+        self.retry_delay = retry_delay
+        self.renderer = renderer
+        self.packer = packer
+
+    def run_item(self, item, content=None, on_generated=None, filename=None):
+        with maybe_profile(self.writer.profiler):
+            return self._run_item(item, content, on_generated, filename)
+
+    def _run_item(self, item, content=None, on_generated=None, filename=None):
+        # filename为已预留的输出路径时直接写入该文件（队列任务续跑），否则按清单的output预留新文件名
+        result = {'prompt': item['prompt'], 'output': None, 'attempts': 0,
+                  'generate': None, 'build': None, 'error': None}
+        doc_kwargs = {key: item[key] for key in DOC_FIELDS if key in item}
+        if filename is None:
+            filename = os.path.join(self.output_dir, item['output'])
+        else:
+            doc_kwargs['reserved'] = True
+
+        for attempt in range(self.retries + 1):
+            result['attempts'] = attempt + 1
+            try:
+                # 已成功生成的内容在重试时复用，仅重新构建文档
+                if content is None:
+                    start = time.perf_counter()
+                    if item.get('sectioned'):
+                        generator = SectionedGenerator(self.writer, rule_set=item.get('rule_set'))
+                        content = list(generator.iter_document_items(item['prompt']))
+                    else:
+                        content = self.writer.generate_content(item['prompt'], rule_set=item.get('rule_set'))
+                    result['generate'] = time.perf_counter() - start
+                    if not content:
+                        content = None
+                        raise RuntimeError('API返回空内容')
+                    # 先持久化生成内容再构建文档，构建失败或进程中断后无需重新请求API
+                    if on_generated is not None:
+                        on_generated(content)
+                start = time.perf_counter()
+                output = (self.renderer or self.writer).create_document(content, filename, **doc_kwargs)
+                if self.renderer is None:
+                    # 开启后台写盘时等待本文档落盘，写入失败按本项失败重试
+                    self.writer.output.wait(output)
+                result['output'] = output
+                result['build'] = time.perf_counter() - start
+                result['error'] = None
+                return result
+            except Exception as e:
+                result['error'] = f'{type(e).__name__}: {e}'
+                if attempt < self.retries:
+                    time.sleep(self.retry_delay * (attempt + 1))
+        return result
+
+    def _groups(self, items):
+        # 返回清单下标的分组，按各组首项下标排列以保持清单顺序；
+        # 未启用合并时每项单独成组，分章节生成的长文档不参与合并
+        if self.packer is None:
+            return [[i] for i in range(len(items))]
+        packable = [i for i, item in enumerate(items) if not item.get('sectioned')]
+        groups = [[i] for i, item in enumerate(items) if item.get('sectioned')]
+        for group in self.packer.plan([items[i]['prompt'] for i in packable]):
+            groups.append([packable[j] for j in group])
+        return sorted(groups, key=lambda group: group[0])
+
+    def _run_group(self, group):
+        if len(group) == 1:
+            return [self.run_item(group[0])]
+        start = time.perf_counter()
+        contents = self.packer.generate_group([item['prompt'] for item in group],
+                                              [item.get('rule_set') for item in group])
+        elapsed = time.perf_counter() - start
+        results = []
+        for item, content in zip(group, contents):
+            # 合并请求中拆分失败的文档由run_item单独请求
+            result = self.run_item(item, content)
+            if content is not None:
+                result['generate'] = elapsed / len(group)
+            results.append(result)
+        return results
+
+    def run(self, items):
+        os.makedirs(self.output_dir, exist_ok=True)
+        # 合并组内的文档在清单中可能不相邻，结果按清单下标放回
+        results = [None] * len(items)
+        done = 0
+        start = time.perf_counter()
+        groups = self._groups(items)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for group, group_results in zip(groups, pool.map(
+                    lambda group: self._run_group([items[i] for i in group]), groups)):
+                for index, result in zip(group, group_results):
+                    results[index] = result
+                    done += 1
+                    status = '完成' if result['error'] is None else f"失败({result['error']})"
+                    print(f"[{done}/{len(items)}] {status}: {result['output'] or result['prompt'][:20]}")
+        return self.summarize(results, time.perf_counter() - start)
+
+    def run_queue(self, queue):
+        """
+        从持久化任务队列中领取并执行任务，直到队列中没有待处理任务
+        已保存生成内容的任务直接构建文档，不再请求API
+        Args:
+            queue: JobQueue实例
+        Returns:
+            本次运行的汇总结果，格式同run()
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        results = []
+        lock = threading.Lock()
+        total = queue.remaining()
+
+        def work():
+            while True:
+                job = queue.claim()
+                if job is None:
+                    return
+                job_id, worker = job['id'], job['worker']
+                # 构建前先预留并记录输出路径，中断后续跑的任务写回同一文件
+                filename = job['output']
+                if filename is None:
+                    filename = self.writer.output.reserve(os.path.join(self.output_dir, job['item']['output']))
+                    queue.set_output(job_id, filename, worker)
+                result = self.run_item(job['item'], job['content'], filename=filename,
+                                       on_generated=lambda content: queue.save_content(job_id, content, worker))
+                if result['error'] is None:
+                    owned = queue.complete(job_id, result['output'], worker)
+                else:
+                    owned = queue.fail(job_id, result['error'], worker)
+                if not owned:
+                    print(f"任务{job_id}的租约已被其它进程接管，本次结果未写入队列")
+                with lock:
+                    results.append(result)
+                    status = '完成' if result['error'] is None else f"失败({result['error']})"
+                    print(f"[{len(results)}/{total}] {status}: {result['output'] or result['prompt'][:20]}")
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for future in [pool.submit(work) for _ in range(self.concurrency)]:
+                future.result()
+        return self.summarize(results, time.perf_counter() - start)
+
+    @staticmethod
+    def summarize(results, elapsed):
+        succeeded = [r for r in results if r['error'] is None]
+        stages = {}
+        for stage in ('generate', 'build'):
+            # 续跑时复用已保存内容的任务没有generate耗时
+            values = [r[stage] for r in succeeded if r[stage] is not None]
+            stages[stage] = {
+                'mean': sum(values) / len(values) if values else 0.0,
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+                'max': max(values) if values else 0.0,
+            }
+        return {
+            'total': len(results),
+            'succeeded': len(succeeded),
+            'failed': len(results) - len(succeeded),
+            'retries': sum(r['attempts'] - 1 for r in results),
+            'elapsed': elapsed,
+            'throughput': len(succeeded) / elapsed if elapsed else 0.0,
+            'stages': stages,
+            'items': results,
+        }
+
+
+def print_summary(summary):
+    print('=' * 40)
+    print(f"总数: {summary['total']}  成功: {summary['succeeded']}  失败: {summary['failed']}  重试: {summary['retries']}")
+    print(f"耗时: {summary['elapsed']:.2f}s  吞吐: {summary['throughput']:.2f} 文档/秒")
+    for stage, stats in summary['stages'].items():
+        print(f"{stage:>8}: mean={stats['mean']:.3f}s p50={stats['p50']:.3f}s "
+              f"p95={stats['p95']:.3f}s max={stats['max']:.3f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='根据任务清单批量生成Word文档')
+    parser.add_argument('manifest', help='JSONL或CSV格式的任务清单')
+    parser.add_argument('-o', '--output-dir', default='output', help='输出目录')
+    parser.add_argument('-c', '--concurrency', type=int, default=4, help='最大并发数')
+    parser.add_argument('-r', '--retries', type=int, default=2, help='单项重试次数')
+    parser.add_argument('--retry-delay', type=float, default=1.0, help='重试基础间隔（秒）')
+    parser.add_argument('--report', help='将汇总报告写入JSON文件')
+    parser.add_argument('--rule-set', help='默认过滤规则集（清单中的rule_set字段优先），如default/markdown/none')
+    parser.add_argument('--profile', help='开启cProfile采样并将结果写入该文件')
+    parser.add_argument('--metrics-json', help='将阶段计时与计数写入JSON文件')
+    parser.add_argument('--metrics-prom', help='将阶段计时与计数写入Prometheus文本格式文件')
+    parser.add_argument('--log-json', action='store_true', help='向stderr输出每个文档的结构化JSON日志')
+    parser.add_argument('--render-workers', type=int, default=0,
+                        help='文档构建使用的子进程数，0表示在线程中构建（其余参数见config.ini的[Render]节）')
+    parser.add_argument('--queue', help='持久化任务队列的SQLite文件，中断后以相同参数重新运行即可续跑')
+    parser.add_argument('--retry-failed', action='store_true', help='续跑时重新执行队列中失败的任务')
+    parser.add_argument('--lease', type=float, default=600,
+                        help='队列任务的租约（秒），其它主机上中断的任务在租约过期后才能被重新领取')
+    parser.add_argument('--pack', action='store_true',
+                        help='将短文档按token预算合并为一个请求（也可在config.ini的[Packing]节开启，不适用于--queue）')
+    args = parser.parse_args(argv)
+
+    if args.log_json:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        metrics_logger = logging.getLogger('aidoc.metrics')
+        metrics_logger.addHandler(handler)
+        metrics_logger.setLevel(logging.INFO)
+
+    writer = AIDocWriter()
+    if args.rule_set:
+        writer.filter_rule_set = args.rule_set
+    if args.profile:
+        writer.profiler = Profiler()
+        writer.profile_output = args.profile
+    items = load_manifest(args.manifest)
+    renderer = None
+    if args.render_workers > 0:
+        # 子进程启动时预热清单中用到的模板
+        templates = sorted({item['template'] for item in items if item.get('template')})
+        renderer = RenderPool.from_config(writer.config, writer.metrics,
+                                          workers=args.render_workers, templates=templates)
+    packer = None
+    if args.pack or PromptPacker.enabled(writer.config):
+        packer = PromptPacker.from_config(writer.config, writer, writer.metrics)
+    runner = BatchRunner(writer, args.output_dir, args.concurrency, args.retries, args.retry_delay, renderer, packer)
+    try:
+        if args.queue:
+            with JobQueue(args.queue, lease=args.lease) as queue:
+                added = queue.enqueue(items)
+                recovered = queue.recover()
+                if args.retry_failed:
+                    queue.retry_failed()
+                counts = queue.counts()
+                print(f"队列: 新增 {added}  收回 {recovered}  待处理 {counts['pending']}  "
+                      f"执行中 {counts['running']}  已完成 {counts['done']}  失败 {counts['failed']}")
+                summary = runner.run_queue(queue)
+        else:
+            summary = runner.run(items)
+    finally:
+        if renderer is not None:
+            renderer.close()
+        writer.output.close()
+    print_summary(summary)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    if args.metrics_json:
+        with open(args.metrics_json, 'w', encoding='utf-8') as f:
+            f.write(writer.metrics.to_json())
+    if args.metrics_prom:
+        with open(args.metrics_prom, 'w', encoding='utf-8') as f:
+            f.write(writer.metrics.to_prometheus())
+    if writer.profiler is not None:
+        writer.profiler.dump(writer.profile_output)
+        print(writer.profiler.summary())
+        if writer.profiler.skipped:
+            print(f"并发执行时同一时刻只采样一个任务，{writer.profiler.skipped} 个任务未采样")
+    return 0 if summary['failed'] == 0 else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
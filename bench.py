@@ -0,0 +1,319 @@
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from docx import Document
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+
+from formatting import DocumentFormatter
+from line import LineFormatter
+from metrics import quiet
+from template import prepare_template
+from word import ContentFilter
+
+DEFAULT_SIZES = (100, 10000, 100000)
+# 逐行构建为平方复杂度，超过此行数不再测量
+LEGACY_MAX_LINES = 10000
+# 冷启动基准：新解释器中导入并创建AIDocWriter，core为无界面核心，gui为经由界面模块导入
+STARTUP_CASES = {
+    'core': 'from core import AIDocWriter; AIDocWriter()',
+    'gui': 'from main import AIDocWriter; AIDocWriter()',
+}
+# 短生命周期工作进程的冷启动目标（秒，含解释器自身启动）
+STARTUP_TARGET = 0.15
+TEMPLATES = {
+    'small': {'paragraphs': 20, 'tables': 1, 'rows': 5, 'cols': 3, 'styles': 5},
+    'large': {'paragraphs': 2000, 'tables': 10, 'rows': 50, 'cols': 6, 'styles': 200},
+}
+
+
+def synthetic_lines(count):
+    return [f'第{i}段：这是用于基准测试的示例内容，包含中文与English混排。' for i in range(count)]
+
+
+def synthetic_completion(count):
+    # 模拟AI回复：夹杂加粗符号与纯符号分隔行
+    lines = []
+    for i, text in enumerate(synthetic_lines(count)):
+        if i % 10 == 0:
+            lines.append('***')
+        lines.append(f'**要点{i}** {text}' if i % 3 == 0 else text)
+    return '\n'.join(lines)
+
+
+def build_template(size):
+    """
+    生成合成模板（含冒号段落、带合并单元格的表格、段落边框与自定义样式），返回.docx字节内容
+    """
+    spec = TEMPLATES[size]
+    doc = Document()
+    for i in range(spec['styles']):
+        style = doc.styles.add_style(f'BenchStyle{i}', 1)
+        style.font.bold = bool(i % 2)
+        style.paragraph_format.space_after = 0
+    doc.add_heading('基准模板', 1)
+    for i in range(spec['paragraphs']):
+        p = doc.add_paragraph(f'字段{i}: 内容' if i % 3 == 0 else f'模板段落{i}')
+        if i % 5 == 0:
+            pPr = p._p.get_or_add_pPr()
+            pPr.append(_pBdr())
+    for _ in range(spec['tables']):
+        table = doc.add_table(rows=spec['rows'], cols=spec['cols'])
+        table.style = 'Table Grid'
+        for row in table.rows:
+            for cell in row.cells:
+                cell.text = '单元格'
+        table.cell(0, 0).merge(table.cell(0, 1))
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def _pBdr():
+    return parse_xml(f'<w:pBdr {nsdecls("w")}><w:bottom w:val="single" w:sz="4" w:space="1" w:color="auto"/></w:pBdr>')
+
+
+def _best_of(repeat, run, setup=None):
+    best = None
+    for _ in range(repeat):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        run(state)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_filter(size, repeat):
+    text = synthetic_completion(size)
+    return _best_of(repeat, lambda _: ContentFilter.filter_ai_symbols(text))
+
+
+def bench_paragraphs_legacy(size, repeat):
+    if size > LEGACY_MAX_LINES:
+        return None
+    lines = synthetic_lines(size)
+    formatter = DocumentFormatter()
+    line_formatter = LineFormatter(spacing_enabled=True)
+
+    def run(doc):
+        for text in lines:
+            p = formatter.create_paragraph(doc, text)
+            line_formatter.set_spacing_border(p)
+            line_formatter.set_spacing_property(p)
+    return _best_of(repeat, run, Document)
+
+
+def bench_paragraphs_bulk(size, repeat):
+    lines = synthetic_lines(size)
+    formatter = DocumentFormatter()
+    line_formatter = LineFormatter(spacing_enabled=True)
+    return _best_of(repeat, lambda doc: formatter.create_paragraphs(doc, lines, line_formatter=line_formatter),
+                    Document)
+
+
+def bench_line_borders(size, repeat):
+    lines = [f'字段{i}: 内容' for i in range(min(size, LEGACY_MAX_LINES))]
+
+    def setup():
+        doc = Document()
+        DocumentFormatter().create_paragraphs(doc, lines)
+        return doc.paragraphs
+
+    def run(paragraphs):
+        line_formatter = LineFormatter(spacing_enabled=True)
+        for para in paragraphs:
+            line_formatter.add_symbol_triggered_border(para, ':')
+            line_formatter.set_spacing_border(para)
+    return _best_of(repeat, run, setup)
+
+
+def bench_save(size, repeat):
+    doc = Document()
+    DocumentFormatter().create_paragraphs(doc, synthetic_lines(size),
+                                          line_formatter=LineFormatter(spacing_enabled=True))
+    return _best_of(repeat, lambda _: doc.save(io.BytesIO()))
+
+
+def bench_template_prepare(template, repeat):
+    data = build_template(template)
+    return _best_of(repeat, prepare_template, lambda: Document(io.BytesIO(data)))
+
+
+def bench_apply_base_styles(template, repeat):
+    data = build_template(template)
+
+    def setup():
+        return DocumentFormatter(template_doc=Document(io.BytesIO(data))), Document()
+    return _best_of(repeat, lambda state: state[0].apply_base_styles(state[1]), setup)
+
+
+def bench_merge_style_properties(template, repeat):
+    data = build_template(template)
+
+    def setup():
+        source = Document(io.BytesIO(data))
+        target = Document()
+        pairs = [(target.styles[s.name], s) for s in source.styles if s.name in target.styles]
+        return DocumentFormatter(), pairs
+
+    def run(state):
+        formatter, pairs = state
+        for target_style, source_style in pairs:
+            formatter.merge_style_properties(target_style, source_style)
+    return _best_of(repeat, run, setup)
+
+
+def bench_pipeline(size, repeat):
+    """
+    完整流水线：本地桩服务 -> generate_content -> create_document（含模板处理与保存）
+    """
+    from cache import ResponseCache
+    from client import CompletionClient
+    from core import AIDocWriter
+    from stubserver import StubCompletionServer
+
+    with StubCompletionServer(synthetic_completion(size)) as stub, tempfile.TemporaryDirectory() as tmp:
+        writer = AIDocWriter()
+        writer.api_base = stub.api_base
+        writer.client = CompletionClient(stub.api_base, 'bench')
+        writer.cache = ResponseCache(enabled=False)
+
+        def run(_):
+            content = writer.generate_content('基准测试')
+            writer.create_document(content, os.path.join(tmp, 'bench.docx'), spacing_enabled=True)
+        return _best_of(repeat, run)
+
+
+def bench_startup(case, repeat):
+    """
+    冷启动：启动新解释器、导入并创建AIDocWriter的总耗时，缺少依赖（如无Tk）时跳过
+    """
+    command = [sys.executable, '-c', STARTUP_CASES[case]]
+    root = os.path.dirname(os.path.abspath(__file__))
+    try:
+        return _best_of(repeat, lambda _: subprocess.run(command, cwd=root, check=True, capture_output=True))
+    except subprocess.CalledProcessError:
+        return None
+
+
+LINE_BENCHMARKS = {
+    'filter': bench_filter,
+    'paragraphs_legacy': bench_paragraphs_legacy,
+    'paragraphs_bulk': bench_paragraphs_bulk,
+    'line_borders': bench_line_borders,
+    'save': bench_save,
+    'pipeline': bench_pipeline,
+}
+TEMPLATE_BENCHMARKS = {
+    'template_prepare': bench_template_prepare,
+    'apply_base_styles': bench_apply_base_styles,
+    'merge_style_properties': bench_merge_style_properties,
+}
+STARTUP_BENCHMARKS = {
+    'startup': bench_startup,
+}
+
+
+def run_suite(names=None, sizes=DEFAULT_SIZES, templates=tuple(TEMPLATES), repeat=3):
+    """
+    运行基准测试套件
+    Returns:
+        {基准名: {规模: 最优耗时秒数}}，不适用的规模为None
+    """
+    results = {}
+    with quiet():
+        for name, bench in LINE_BENCHMARKS.items():
+            if names and name not in names:
+                continue
+            results[name] = {str(size): bench(size, repeat) for size in sizes}
+        for name, bench in TEMPLATE_BENCHMARKS.items():
+            if names and name not in names:
+                continue
+            results[name] = {template: bench(template, repeat) for template in templates}
+        for name, bench in STARTUP_BENCHMARKS.items():
+            if names and name not in names:
+                continue
+            results[name] = {case: bench(case, repeat) for case in STARTUP_CASES}
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    与历史结果比较，返回变慢超过阈值的(基准名, 规模, 倍数)列表
+    """
+    regressions = []
+    for name, cases in results.items():
+        for case, seconds in cases.items():
+            previous = baseline.get(name, {}).get(case)
+            if seconds and previous:
+                ratio = seconds / previous
+                if ratio > threshold:
+                    regressions.append((name, case, ratio))
+    return regressions
+
+
+def print_results(results, baseline=None):
+    for name, cases in results.items():
+        for case, seconds in cases.items():
+            if seconds is None:
+                print(f'{name:>24} {case:>8}: 跳过')
+                continue
+            line = f'{name:>24} {case:>8}: {seconds * 1000:10.2f} ms'
+            previous = (baseline or {}).get(name, {}).get(case)
+            if previous:
+                line += f'  (基线 {previous * 1000:.2f} ms, {seconds / previous:.2f}x)'
+            print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='过滤、格式化与保存热路径的基准测试')
+    parser.add_argument('names', nargs='*', help='只运行指定基准，可选: '
+                        + ', '.join(list(LINE_BENCHMARKS) + list(TEMPLATE_BENCHMARKS) + list(STARTUP_BENCHMARKS)))
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help='行数规模，逗号分隔')
+    parser.add_argument('--templates', default=','.join(TEMPLATES), help='模板规模，逗号分隔')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数，取最优值')
+    parser.add_argument('--save', help='将结果写入JSON文件')
+    parser.add_argument('--compare', help='与历史JSON结果比较')
+    parser.add_argument('--threshold', type=float, default=1.2, help='判定为性能回退的耗时倍数')
+    parser.add_argument('--startup-target', type=float, default=STARTUP_TARGET * 1000,
+                        help='无界面核心的冷启动目标（毫秒），超出时返回非零退出码')
+    args = parser.parse_args(argv)
+
+    results = run_suite(
+        names=set(args.names),
+        sizes=[int(size) for size in args.sizes.split(',') if size],
+        templates=[name for name in args.templates.split(',') if name],
+        repeat=args.repeat,
+    )
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    status = 0
+    startup = results.get('startup', {}).get('core')
+    if startup and startup * 1000 > args.startup_target:
+        print(f'冷启动超出目标: {startup * 1000:.1f} ms > {args.startup_target:.0f} ms')
+        status = 1
+    if baseline:
+        regressions = compare(results, baseline, args.threshold)
+        for name, case, ratio in regressions:
+            print(f'性能回退: {name} {case} 变慢 {ratio:.2f}x')
+        if regressions:
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """
+    按请求内容寻址的回复缓存：内存LRU层 + SQLite持久层
+    持久层读写失败（如被其它进程锁定、磁盘已满）时打印提示并退化为仅内存层，不向调用方抛出
+    Args:
+        path: SQLite文件路径，为空时仅使用内存层
+        memory_items: 内存层最大条目数
+        disk_items: 持久层最大条目数，超出后按最近访问时间淘汰
+        ttl: 条目有效期（秒），0表示永不过期
+        enabled: 是否启用缓存
+    """
+
+    def __init__(self, path=None, memory_items=128, disk_items=5000, ttl=0, enabled=True):
+        self.path = path
+        self.memory_items = memory_items
+        self.disk_items = disk_items
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if enabled and path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)'
+            )
+            self._conn.commit()
+
+    @classmethod
+    def from_config(cls, config):
+        section = 'Cache'
+        return cls(
+            path=config.get(section, 'path', fallback='') or None,
+            memory_items=config.getint(section, 'memory_items', fallback=128),
+            disk_items=config.getint(section, 'disk_items', fallback=5000),
+            ttl=config.getfloat(section, 'ttl', fallback=0),
+            enabled=config.getboolean(section, 'enabled', fallback=True),
+        )
+
+    @staticmethod
+    def make_key(model, messages, temperature, api_base):
+        raw = json.dumps([model, messages, temperature, api_base], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _expired(self, created, now):
+        return self.ttl and now - created > self.ttl
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if not self._expired(created, now):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+            if self._conn is not None:
+                try:
+                    value = self._disk_get(key, now)
+                except sqlite3.Error as e:
+                    # 持久层被其它进程锁定或损坏时按未命中处理
+                    self._rollback(e)
+                    value = None
+                if value is not None:
+                    self.hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def _disk_get(self, key, now):
+        row = self._conn.execute(
+            'SELECT value, created FROM responses WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, created = row
+        if self._expired(created, now):
+            self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self._conn.commit()
+            return None
+        self._remember(key, value, created)
+        try:
+            self._conn.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+        except sqlite3.Error:
+            # 只是更新访问时间失败（如其它进程正在写入）时仍返回已读到的值
+            self._conn.rollback()
+        return value
+
+    def _rollback(self, error):
+        print(f"回复缓存读写失败: {error}")
+        try:
+            self._conn.rollback()
+        except sqlite3.Error:
+            pass
+
+    def set(self, key, value):
+        if not self.enabled or value is None:
+            return
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._conn is not None:
+                try:
+                    self._conn.execute(
+                        'INSERT OR REPLACE INTO responses (key, value, created, accessed) VALUES (?, ?, ?, ?)',
+                        (key, value, now, now)
+                    )
+                    self._evict(now)
+                    self._conn.commit()
+                except sqlite3.Error as e:
+                    # 多个批量进程共用缓存文件时可能被锁定，磁盘也可能已满；
+                    # 此时只保留内存层，不让写缓存失败影响已取得的回复
+                    self._rollback(e)
+
+    def _remember(self, key, value, created):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now):
+        if self.ttl:
+            self._conn.execute('DELETE FROM responses WHERE created < ?', (now - self.ttl,))
+        self._conn.execute(
+            'DELETE FROM responses WHERE key IN ('
+            'SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+            (self.disk_items,)
+        )
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute('DELETE FROM responses')
+                self._conn.commit()
+
+    @property
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'memory_items': len(self._memory)}
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
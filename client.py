@@ -0,0 +1,286 @@
+import json
+import random
+import re
+import socket
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+_CJK_RE = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+
+
+def estimate_tokens(text):
+    """
+    本地粗略估算文本的token数：中日文字符按1个token计，其余按4个字符1个token计
+    Args:
+        text: 待估算文本
+    Returns:
+        估算的token数
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class TokenBucket:
+    """
+    令牌桶限流器，按每分钟速率匀速补充令牌
+    Args:
+        per_minute: 每分钟允许的令牌数，0表示不限流
+    """
+
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.per_minute / 60.0)
+        self.updated = now
+
+    def try_acquire(self, amount=1):
+        """
+        尝试取出令牌，成功返回0，否则返回需要等待的秒数
+        """
+        if not self.per_minute:
+            return 0
+        # 单次请求超过桶容量时按容量计，避免永久阻塞
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0
+            return (amount - self.tokens) * 60.0 / self.per_minute
+
+    def acquire(self, amount=1):
+        while True:
+            wait = self.try_acquire(amount)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def consume(self, amount):
+        # 事后按实际用量扣减，允许余额为负以抵扣后续请求
+        if not self.per_minute or amount <= 0:
+            return
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+
+
+class CompletionClient:
+    """
+    /chat/completions接口客户端：连接池复用、超时控制、指数退避重试与客户端限流
+    Args:
+        api_base: 接口根地址
+        api_key: 鉴权密钥
+        timeout: 读取超时（秒）
+        connect_timeout: 建立连接超时（秒）
+        max_retries: 429/5xx及网络错误的最大重试次数
+        backoff_base: 退避基础间隔（秒），每次重试翻倍
+        backoff_max: 单次退避的最大间隔（秒）
+        pool_size: 连接池大小
+        requests_per_minute: 每分钟请求数上限，0表示不限
+        tokens_per_minute: 每分钟token数上限，0表示不限
+        metrics: 可选的Metrics实例，记录请求耗时、错误数与token用量
+    """
+
+    def __init__(self, api_base, api_key, timeout=60.0, connect_timeout=10.0, max_retries=3,
+                 backoff_base=1.0, backoff_max=30.0, pool_size=10,
+                 requests_per_minute=0, tokens_per_minute=0, metrics=None):
+        self.api_base = api_base.rstrip('/')
+        self.api_key = api_key
+        self.timeout = (connect_timeout, timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool_size = pool_size
+        self.metrics = metrics
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        })
+
+    @classmethod
+    def from_config(cls, config, api_base, api_key, metrics=None, section='Client', **overrides):
+        # section中未配置的项回退到[Client]节（用于[Backend:*]节覆盖部分参数）；
+        # overrides中的参数（如负载测试指定的pool_size）优先于配置
+        def option(getter, key, fallback):
+            return getter(section, key, fallback=getter('Client', key, fallback=fallback))
+
+        options = dict(
+            timeout=option(config.getfloat, 'timeout', 60.0),
+            connect_timeout=option(config.getfloat, 'connect_timeout', 10.0),
+            max_retries=option(config.getint, 'max_retries', 3),
+            backoff_base=option(config.getfloat, 'backoff_base', 1.0),
+            backoff_max=option(config.getfloat, 'backoff_max', 30.0),
+            pool_size=option(config.getint, 'pool_size', 10),
+            requests_per_minute=option(config.getint, 'requests_per_minute', 0),
+            tokens_per_minute=option(config.getint, 'tokens_per_minute', 0),
+            metrics=metrics,
+        )
+        options.update((key, value) for key, value in overrides.items() if value is not None)
+        return cls(api_base, api_key, **options)
+
+    def retry_delay(self, attempt, retry_after=None):
+        """
+        计算第attempt次重试前的等待时间，优先使用服务端Retry-After
+        """
+        if retry_after:
+            try:
+                return min(self.backoff_max, max(0.0, float(retry_after)))
+            except ValueError:
+                try:
+                    delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                    return min(self.backoff_max, max(0.0, delay))
+                except (TypeError, ValueError):
+                    pass
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    def post(self, payload, stream=False):
+        """
+        发送补全请求，对429/5xx与网络错误按指数退避重试
+        Args:
+            payload: 请求体
+            stream: 是否以流式方式读取响应
+        Returns:
+            状态码正常的requests.Response
+        """
+        prompt_text = ''.join(m.get('content', '') for m in payload.get('messages', []))
+        self.request_bucket.acquire(1)
+        self.token_bucket.acquire(estimate_tokens(prompt_text))
+
+        url = f"{self.api_base}/chat/completions"
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                self._record('request_retries')
+                time.sleep(self.retry_delay(attempt))
+                attempt += 1
+                continue
+
+            if response.status_code in RETRY_STATUS and attempt < self.max_retries:
+                delay = self.retry_delay(attempt, response.headers.get('Retry-After'))
+                response.close()
+                self._record('request_retries')
+                print(f"API返回{response.status_code}，{delay:.1f}秒后第{attempt + 1}次重试")
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            response.raise_for_status()
+            return response
+
+    def _record(self, name, value=1):
+        if self.metrics is not None:
+            self.metrics.incr(name, value)
+
+    def _timed_post(self, payload, stream=False):
+        start = time.perf_counter()
+        self._record('requests')
+        try:
+            return self.post(payload, stream=stream)
+        except Exception:
+            self._record('request_errors')
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.observe('request', time.perf_counter() - start)
+
+    def _prompt_tokens(self, payload):
+        return estimate_tokens(''.join(m.get('content', '') for m in payload.get('messages', [])))
+
+    def chat(self, payload):
+        """
+        发送非流式请求并返回回复文本
+        """
+        response = self._timed_post(payload)
+        data = response.json()
+        content = data['choices'][0]['message']['content']
+        usage = data.get('usage') or {}
+        self.token_bucket.consume(usage.get('completion_tokens', 0))
+        self._record('tokens_in', usage.get('prompt_tokens') or self._prompt_tokens(payload))
+        self._record('tokens_out', usage.get('completion_tokens') or estimate_tokens(content))
+        return content
+
+    def stream(self, payload):
+        """
+        发送流式请求，返回逐个产出增量文本的生成器
+        请求在调用时立即发出，连接在生成器耗尽或关闭时释放
+        """
+        return self.iter_stream(self.open_stream(payload))
+
+    def open_stream(self, payload):
+        """
+        发出流式请求，收到响应头后返回尚未读取正文的Response，由iter_stream读取
+        """
+        response = self._timed_post(dict(payload, stream=True), stream=True)
+        self._record('tokens_in', self._prompt_tokens(payload))
+        return response
+
+    def iter_stream(self, response):
+        completion = []
+        with response:
+            for delta in iter_sse_deltas(response):
+                completion.append(delta)
+                yield delta
+        tokens = estimate_tokens(''.join(completion))
+        self.token_bucket.consume(tokens)
+        self._record('tokens_out', tokens)
+
+    def close(self):
+        self.session.close()
+
+
+def abort_response(response):
+    """
+    从其它线程中止正在读取的流式响应：先关闭底层socket，使阻塞中的读取立即出错返回，
+    再关闭响应（仅调用close时读取线程要等到下一个数据块到达才会退出）
+    """
+    connection = getattr(response.raw, '_connection', None)
+    sock = getattr(connection, 'sock', None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
+
+
+def iter_sse_deltas(response):
+    # 解析SSE事件流，逐个返回增量文本
+    for raw in response.iter_lines():
+        if not raw:
+            continue
+        line = raw.decode('utf-8')
+        if not line.startswith('data:'):
+            continue
+        data = line[len('data:'):].strip()
+        if data == '[DONE]':
+            break
+        choices = json.loads(data).get('choices') or []
+        if choices:
+            delta = choices[0].get('delta', {}).get('content')
+            if delta:
+                yield delta
@@ -0,0 +1,222 @@
+import random
+import re
+import threading
+import unicodedata
+import zlib
+from collections import OrderedDict
+
+_HSPACE_RE = re.compile(r'[^\S\n]+')
+_BLANK_LINES_RE = re.compile(r'\n{3,}')
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize_prompt(text):
+    """
+    规范化提示词：NFKC统一全半角、统一换行符、行内连续空白合并为一个空格、
+    去除行首尾空白与多余空行，使仅有空白差异的提示词得到相同的请求与缓存键
+    """
+    text = unicodedata.normalize('NFKC', text).replace('\r\n', '\n').replace('\r', '\n')
+    lines = [_HSPACE_RE.sub(' ', line).strip() for line in text.split('\n')]
+    return _BLANK_LINES_RE.sub('\n\n', '\n'.join(lines)).strip()
+
+
+class SingleFlight:
+    """
+    相同键的并发调用只执行一次，其余调用等待并共享结果（或异常）
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """
+        Returns:
+            (结果, 是否复用了其它调用的结果)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'done': threading.Event(), 'result': None, 'error': None}
+        if not leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result'], True
+
+        try:
+            call['result'] = fn()
+        except BaseException as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call['done'].set()
+        return call['result'], False
+
+
+class MinHashIndex:
+    """
+    基于字符shingle与MinHash/LSH的近似重复检索，按作用域（模型、温度等）隔离
+    Args:
+        threshold: 判定为近似重复的最低估计Jaccard相似度
+        num_perm: MinHash签名长度
+        bands: LSH分带数，须整除num_perm
+        shingle_size: 字符shingle长度
+        max_items: 最多保留的条目数，超出后淘汰最久未使用的条目
+    """
+
+    def __init__(self, threshold=0.9, num_perm=64, bands=16, shingle_size=3, max_items=1000):
+        if num_perm % bands:
+            raise ValueError('num_perm必须能被bands整除')
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.max_items = max_items
+        rng = random.Random(1)
+        self._perms = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+                       for _ in range(num_perm)]
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._buckets = {}
+
+    def shingles(self, text):
+        text = ''.join(text.lower().split())
+        size = self.shingle_size
+        if len(text) <= size:
+            return {text}
+        return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+    def signature(self, text):
+        hashes = [zlib.crc32(s.encode('utf-8')) for s in self.shingles(text)]
+        return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self._perms)
+
+    def _band_keys(self, scope, signature):
+        rows = self.rows
+        return [(scope, i, signature[i * rows:(i + 1) * rows]) for i in range(self.bands)]
+
+    def lookup(self, text, scope=None):
+        """
+        查找估计相似度不低于阈值的已有条目
+        Returns:
+            (值, 相似度)，未找到时返回None
+        """
+        signature = self.signature(text)
+        best = None
+        with self._lock:
+            candidates = set()
+            for band_key in self._band_keys(scope, signature):
+                candidates.update(self._buckets.get(band_key, ()))
+            for key in candidates:
+                other, value = self._entries[key]
+                similarity = sum(x == y for x, y in zip(signature, other)) / self.num_perm
+                if similarity >= self.threshold and (best is None or similarity > best[2]):
+                    best = (key, value, similarity)
+            if best is None:
+                return None
+            self._entries.move_to_end(best[0])
+        return best[1], best[2]
+
+    def add(self, text, value, scope=None):
+        signature = self.signature(text)
+        key = (scope, text)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (signature, value)
+            for band_key in self._band_keys(scope, signature):
+                self._buckets.setdefault(band_key, set()).add(key)
+            while len(self._entries) > self.max_items:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        signature, _ = self._entries.pop(key)
+        for band_key in self._band_keys(key[0], signature):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RequestCoalescer:
+    """
+    generate_content前的请求合并：规范化提示词，相同的进行中请求只发出一次API调用（single-flight），
+    可选地对近似重复的提示词直接复用已有回复
+    Args:
+        normalize: 是否按规范化后的提示词合并与查找（仅影响合并键，不改写发送给模型的提示词）
+        similarity: 近似重复复用的相似度阈值（0~1），0表示不复用
+        metrics: 可选的Metrics实例，记录合并与复用次数
+        **index_options: 传给MinHashIndex的参数
+    """
+
+    def __init__(self, normalize=True, similarity=0.0, metrics=None, **index_options):
+        self.normalize_enabled = normalize
+        self.metrics = metrics
+        self.flight = SingleFlight()
+        self.index = MinHashIndex(threshold=similarity, **index_options) if similarity > 0 else None
+
+    @classmethod
+    def from_config(cls, config, metrics=None):
+        section = 'Coalesce'
+        return cls(
+            normalize=config.getboolean(section, 'normalize', fallback=True),
+            similarity=config.getfloat(section, 'similarity', fallback=0.0),
+            metrics=metrics,
+            num_perm=config.getint(section, 'num_perm', fallback=64),
+            bands=config.getint(section, 'bands', fallback=16),
+            shingle_size=config.getint(section, 'shingle_size', fallback=3),
+            max_items=config.getint(section, 'max_items', fallback=1000),
+        )
+
+    def normalize(self, prompt):
+        return normalize_prompt(prompt) if self.normalize_enabled else prompt
+
+    def _record(self, name):
+        if self.metrics is not None:
+            self.metrics.incr(name)
+
+    def similar(self, prompt, scope=None):
+        """
+        查找近似重复提示词的已有回复，未启用或未命中时返回None
+        """
+        if self.index is None:
+            return None
+        found = self.index.lookup(prompt, scope)
+        if found is None:
+            return None
+        self._record('coalesced_similar')
+        return found[0]
+
+    def remember(self, prompt, content, scope=None):
+        if self.index is not None and content:
+            self.index.add(prompt, content, scope)
+
+    def fetch(self, key, prompt, call, scope=None, use_similar=True):
+        """
+        获取回复：先查近似重复，再以key合并进行中的相同请求
+        Args:
+            key: 精确请求键（如缓存键）
+            prompt: 规范化后的提示词
+            call: 实际发出请求的函数
+            scope: 近似重复的作用域，不同模型/参数的回复互不复用
+            use_similar: 是否允许复用近似重复的回复
+        Returns:
+            回复文本
+        """
+        if use_similar:
+            content = self.similar(prompt, scope)
+            if content is not None:
+                return content
+        content, shared = self.flight.do(key, call)
+        if shared:
+            self._record('coalesced_inflight')
+        self.remember(prompt, content, scope)
+        return content
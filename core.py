@@ -0,0 +1,29 @@
+"""
+无界面依赖的核心接口：AIDocWriter、DocumentFormatter、LineFormatter、ContentFilter
+各名称在首次访问时才导入所在模块，工作进程与命令行工具无需加载tkinter，
+python-docx/lxml与requests推迟到实际构建文档或发出请求时加载
+"""
+import importlib
+
+_EXPORTS = {
+    'AIDocWriter': 'writer',
+    'DocumentFormatter': 'formatting',
+    'LineFormatter': 'line',
+    'ContentFilter': 'word',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    # 缓存到模块命名空间，之后的访问不再经过__getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -3,8 +3,111 @@ from docx.shared import Pt
 from docx.oxml.ns import qn
 from docx.oxml import parse_xml
 from docx.oxml.ns import nsmap
+from docx.oxml import OxmlElement
+from docx.text.paragraph import Paragraph
+from docx.styles.style import StyleFactory
 
 import copy
+import weakref
+
+FONT_ATTRS = ('name', 'size', 'bold', 'italic', 'underline')
+PARAGRAPH_ATTRS = ('alignment', 'first_line_indent', 'line_spacing', 'space_before', 'space_after')
+
+
+class StylePlan:
+    """
+    模板样式的预编译注入计划：构建时一次性解析模板中每个样式，
+    目标文档缺少的样式记录清理后的XML副本，已有的样式记录需要合并的属性值。
+    计划构建后不再修改，也不会改动源模板，可在多个文档/线程间复用
+    """
+
+    _cache = weakref.WeakKeyDictionary()
+
+    def __init__(self, entries):
+        # 每项为(内部样式名, 样式XML副本, 字体属性, 颜色RGB, 段落属性, 是否清除目标段落边框)
+        self.entries = tuple(entries)
+
+    @classmethod
+    def for_template(cls, template_doc):
+        """
+        获取模板文档对应的计划，同一模板对象只构建一次
+        """
+        # Document对象不支持弱引用，以其文档部件为键
+        plan = cls._cache.get(template_doc.part)
+        if plan is None:
+            plan = cls._cache[template_doc.part] = cls.build(template_doc)
+        return plan
+
+    @classmethod
+    def build(cls, template_doc):
+        formatter = DocumentFormatter()
+        entries = []
+        for style_elm in template_doc.styles.element.style_lst:
+            name = style_elm.name_val
+            if name is None:
+                continue
+            source = StyleFactory(style_elm)
+
+            element = copy.deepcopy(style_elm)
+            formatter.clean_decorative_lines(element)
+
+            font_values, color = (), None
+            source_font = getattr(source, 'font', None)
+            if source_font is not None:
+                font_values = tuple(
+                    (attr, value) for attr, value in ((a, getattr(source_font, a, None)) for a in FONT_ATTRS)
+                    if value not in [None, False]
+                )
+                if source_font.color.type is not None:
+                    color = source_font.color.rgb
+
+            para_values, strip_pbdr = (), False
+            source_para = getattr(source, 'paragraph_format', None)
+            if source_para is not None:
+                para_values = tuple(
+                    (attr, value) for attr, value in ((a, getattr(source_para, a, None)) for a in PARAGRAPH_ATTRS)
+                    if value is not None
+                )
+                pPr = style_elm.pPr
+                strip_pbdr = pPr is not None and pPr.find(qn('w:pBdr')) is not None
+
+            entries.append((name, element, font_values, color, para_values, strip_pbdr))
+        return cls(entries)
+
+    def apply(self, doc):
+        """
+        将计划一次性应用到目标文档
+        """
+        styles_elm = doc.styles.element
+        existing = {style_elm.name_val: style_elm for style_elm in styles_elm.style_lst}
+        for name, element, font_values, color, para_values, strip_pbdr in self.entries:
+            target_elm = existing.get(name)
+            if target_elm is None:
+                # 目标文档缺少的样式直接注入XML副本
+                new_elm = copy.deepcopy(element)
+                styles_elm.append(new_elm)
+                existing[name] = new_elm
+                continue
+            # 跳过基础样式的覆盖
+            if name == 'Normal':
+                continue
+
+            target = StyleFactory(target_elm)
+            target_font = getattr(target, 'font', None)
+            if target_font is not None:
+                for attr, value in font_values:
+                    setattr(target_font, attr, value)
+                if color is not None:
+                    target_font.color.rgb = color
+
+            target_para = getattr(target, 'paragraph_format', None)
+            if target_para is not None and (para_values or strip_pbdr):
+                for attr, value in para_values:
+                    setattr(target_para, attr, value)
+                target_pPr = target_elm.pPr
+                if strip_pbdr and target_pPr is not None:
+                    DocumentFormatter().clean_decorative_lines(target_pPr, keep_borders=True)
+
 
 class DocumentFormatter:
     def __init__(self, font_name='微软雅黑', font_size=12, template_doc=None):
@@ -13,17 +116,21 @@ class DocumentFormatter:
         self.template_doc = template_doc
 
     def clean_decorative_lines(self, element, keep_borders=False):
-        # 清理装饰线时保留边框
+        # 清理装饰线时保留边框，返回移除的元素数
+        removed = 0
         if not keep_borders:
             for border_attr in ['top', 'left', 'bottom', 'right', 'between']:
                 elem = element.find(qn(f'w:{border_attr}'))
                 if elem is not None:
                     element.remove(elem)
+                    removed += 1
         
         # 清理段落边框
         pBdr = element.find(qn('w:pBdr'))
         if pBdr is not None:
             element.remove(pBdr)
+            removed += 1
+        return removed
 
     def merge_style_properties(self, target_style, source_style):
         # 跳过基础样式的覆盖并清理边框属性
@@ -33,18 +140,23 @@ class DocumentFormatter:
         # 清理源样式的边框属性
         self.clean_decorative_lines(source_style.element)
         
-        # 深度合并字体属性
-        source_font = source_style.font
-        target_font = target_style.font
+        # 深度合并字体属性（编号样式没有字体属性）
+        source_font = getattr(source_style, 'font', None)
+        target_font = getattr(target_style, 'font', None)
+        if source_font is not None and target_font is not None:
+            for attr in ['name', 'size', 'bold', 'italic', 'underline']:
+                value = getattr(source_font, attr, None)
+                if value not in [None, False]:
+                    setattr(target_font, attr, value)
+            # color为只读的ColorFormat对象，需单独复制RGB值
+            if source_font.color.type is not None and source_font.color.rgb is not None:
+                target_font.color.rgb = source_font.color.rgb
         
-        for attr in ['name', 'size', 'color', 'bold', 'italic', 'underline']:
-            value = getattr(source_font, attr, None)
-            if value not in [None, False]:
-                setattr(target_font, attr, value)
-        
-        # 合并段落格式
-        source_para = source_style.paragraph_format
-        target_para = target_style.paragraph_format
+        # 合并段落格式（字符样式没有段落格式）
+        source_para = getattr(source_style, 'paragraph_format', None)
+        target_para = getattr(target_style, 'paragraph_format', None)
+        if source_para is None or target_para is None:
+            return
         for attr in ['alignment', 'first_line_indent', 'line_spacing', 'space_before', 'space_after']:
             value = getattr(source_para, attr, None)
             if value is not None:
@@ -52,8 +164,10 @@ class DocumentFormatter:
         # 清理段落边框属性
         if hasattr(source_para, 'borders'):
             target_para.border = None
-        if source_para.element.pBdr is not None:
-            target_para.element.pPr.remove_all('pBdr')
+        source_pPr = source_style.element.pPr
+        target_pPr = target_style.element.pPr
+        if source_pPr is not None and target_pPr is not None and source_pPr.find(qn('w:pBdr')) is not None:
+            self.clean_decorative_lines(target_pPr, keep_borders=True)
 
     def copy_paragraph_styles(self, target_doc, template_doc, paragraph, **kwargs):
         if template_doc:
@@ -68,7 +182,8 @@ class DocumentFormatter:
                 new_style = target_doc.styles.add_style(template_style.name, template_style.type)
                 new_style.element.append(copy.deepcopy(template_style.element))
             else:
-                self.merge_style_properties(target_doc.styles[template_style.name], template_style)
+                new_style = target_doc.styles[template_style.name]
+                self.merge_style_properties(new_style, template_style)
             if kwargs.get('bold'):
                 new_style.font.bold = True
             if kwargs.get('italic'):
@@ -76,16 +191,8 @@ class DocumentFormatter:
 
     def apply_base_styles(self, doc):
         if self.template_doc:
-            for style in self.template_doc.styles:
-                # 检查样式是否已存在
-                if style.name not in doc.styles:
-                    # 深拷贝样式元素
-                    new_style = doc.styles.add_style(style.name, style.type)
-                    new_style.element.append(copy.deepcopy(style.element))
-                else:
-                    # 合并样式属性
-                    existing_style = doc.styles[style.name]
-                    self.merge_style_properties(existing_style, style)
+            # 使用预编译的样式计划一次性注入/合并，不修改源模板
+            StylePlan.for_template(self.template_doc).apply(doc)
         else:
             # 保留原有基础样式设置
             style = doc.styles['Normal']
@@ -108,6 +215,55 @@ class DocumentFormatter:
         run.italic = italic
         return p
 
+    def build_paragraph_prototype(self, bold=False, italic=False, line_formatter=None):
+        # 按create_paragraph + LineFormatter的效果构建一次段落原型，后续段落直接克隆
+        prototype = Paragraph(OxmlElement('w:p'), None)
+        run = prototype.add_run()
+        run.font.name = self.font_name
+        run._element.rPr.rFonts.set(qn('w:eastAsia'), self.font_name)
+        run.bold = bold
+        run.italic = italic
+        if line_formatter:
+            line_formatter.set_spacing_border(prototype)
+            line_formatter.set_spacing_property(prototype)
+        return prototype._p
+
+    def create_paragraphs(self, doc, texts, bold=False, italic=False, line_formatter=None):
+        """
+        批量追加段落，效果等同于逐行调用create_paragraph与LineFormatter，
+        但字体与pPr/边框/间距片段只构建一次，之后克隆原型并直接插入文档主体
+        Args:
+            doc: 目标文档
+            texts: 段落的可迭代对象（可为流式生成器），元素为文本，
+                   或(样式名, 文本)元组——带样式的段落（如标题）逐个创建且不加间隔线
+            line_formatter: 可选的LineFormatter，用于间隔线设置
+        Returns:
+            追加的段落数
+        """
+        prototype = self.build_paragraph_prototype(bold, italic, line_formatter)
+        body = doc.element.body
+        sectPr = body.sectPr
+        count = 0
+        for text in texts:
+            if isinstance(text, tuple):
+                style_name, text = text
+                if style_name:
+                    self.create_paragraph(doc, text, bold=bold, italic=italic, style_name=style_name)
+                    count += 1
+                    continue
+            p = copy.deepcopy(prototype)
+            p.r_lst[0].text = text
+            if sectPr is not None:
+                sectPr.addprevious(p)
+            else:
+                body.append(p)
+            count += 1
+        return count
+
     @staticmethod
     def configure_font(font_size_str):
+        # 支持"小四(12)"形式与纯数字字号
+        font_size_str = str(font_size_str)
+        if '(' not in font_size_str:
+            return Pt(float(font_size_str))
         return Pt(float(font_size_str.split('(')[1].replace(')','')))
\ No newline at end of file
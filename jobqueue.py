@@ -0,0 +1,302 @@
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+
+
+def _encode_content(content):
+    # 分章节生成的内容为(样式名, 文本)元组与文本混合的列表，统一以JSON保存
+    return json.dumps(content, ensure_ascii=False)
+
+
+def _decode_content(raw):
+    if raw is None:
+        return None
+    content = json.loads(raw)
+    if isinstance(content, list):
+        return [tuple(item) if isinstance(item, list) else item for item in content]
+    return content
+
+
+def _pid_alive(pid):
+    # 判断本机进程是否仍在运行；Windows上os.kill会结束目标进程，须改用OpenProcess查询
+    if os.name == 'nt':
+        import ctypes
+
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            # 拒绝访问说明进程存在但属于其它用户
+            return kernel32.GetLastError() == 5
+        code = ctypes.c_ulong()
+        try:
+            kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        finally:
+            kernel32.CloseHandle(handle)
+        return code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _orphaned(worker, host):
+    # 领取者标识为"主机名:进程号:线程号"，仅能判断本机上的进程；自定义标识与其它主机的任务由租约处理
+    parts = (worker or '').rsplit(':', 2)
+    if len(parts) != 3 or parts[0] != host or not parts[1].isdigit():
+        return False
+    return not _pid_alive(int(parts[1]))
+
+
+class JobQueue:
+    """
+    基于SQLite的持久化生成任务队列：记录提示词、参数、生成内容、状态与输出路径
+    工作线程/进程通过claim()原子领取任务；API返回的内容在构建文档前先落盘，
+    中断后重新运行只处理未完成的任务，已生成内容的任务不再请求API
+    执行中的任务由后台线程每lease/3秒续租，运行时间超过租约的任务不会被重复领取；
+    本机上领取者进程已退出的running任务可由recover()立即收回，不必等待租约过期
+    Args:
+        path: SQLite文件路径
+        lease: 任务领取后的租约（秒），超时未续租的running任务可被重新领取
+    """
+
+    def __init__(self, path, lease=600):
+        self.path = path
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._held = {}
+        self._held_lock = threading.Lock()
+        self._heartbeat = None
+        self._stopping = threading.Event()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # 自动提交模式，事务由_transaction显式控制；timeout用于多进程争用写锁时等待
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT UNIQUE NOT NULL, '
+            'prompt TEXT NOT NULL, params TEXT NOT NULL, status TEXT NOT NULL, '
+            'content TEXT, output TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, '
+            'worker TEXT, created REAL NOT NULL, updated REAL NOT NULL, claimed REAL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)')
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE立即获取写锁，保证"查询+更新"对其它进程原子
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    @staticmethod
+    def make_key(item):
+        raw = json.dumps(item, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def enqueue(self, items):
+        """
+        添加任务，内容相同的任务只入队一次，因此可对同一清单重复调用以续跑
+        Args:
+            items: 任务字典的可迭代对象，每项至少包含prompt字段
+        Returns:
+            新增的任务数
+        """
+        now = time.time()
+        added = 0
+        with self._transaction() as conn:
+            for item in items:
+                cursor = conn.execute(
+                    'INSERT OR IGNORE INTO jobs (key, prompt, params, status, created, updated) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (self.make_key(item), item['prompt'], json.dumps(item, ensure_ascii=False), PENDING, now, now)
+                )
+                added += cursor.rowcount
+        return added
+
+    def claim(self, worker=None):
+        """
+        原子领取一个待处理任务（含租约过期的running任务）
+        Args:
+            worker: 领取者标识，默认为主机名:进程号:线程号
+        Returns:
+            任务字典（id, item, content, attempts, worker, output），无任务时返回None；
+            output为此前预留的输出路径（见set_output），首次执行时为None
+        """
+        worker = worker or f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT id, params, content, attempts, output FROM jobs '
+                'WHERE status = ? OR (status = ? AND claimed < ?) ORDER BY id LIMIT 1',
+                (PENDING, RUNNING, now - self.lease)
+            ).fetchone()
+            if row is None:
+                return None
+            job_id, params, content, attempts, output = row
+            conn.execute(
+                'UPDATE jobs SET status = ?, worker = ?, claimed = ?, updated = ?, attempts = ? WHERE id = ?',
+                (RUNNING, worker, now, now, attempts + 1, job_id)
+            )
+        self._hold(job_id, worker)
+        return {'id': job_id, 'item': json.loads(params), 'content': _decode_content(content),
+                'attempts': attempts + 1, 'worker': worker, 'output': output}
+
+    def recover(self):
+        """
+        将本机上领取者进程已退出（如崩溃或被强制结束）的running任务重新置为待处理
+        Returns:
+            收回的任务数
+        """
+        host = socket.gethostname()
+        with self._transaction() as conn:
+            rows = conn.execute('SELECT id, worker FROM jobs WHERE status = ?', (RUNNING,)).fetchall()
+            orphans = [job_id for job_id, worker in rows if _orphaned(worker, host)]
+            now = time.time()
+            for job_id in orphans:
+                conn.execute('UPDATE jobs SET status = ?, worker = NULL, claimed = NULL, updated = ? '
+                             'WHERE id = ? AND status = ?', (PENDING, now, job_id, RUNNING))
+        return len(orphans)
+
+    def _hold(self, job_id, worker):
+        with self._held_lock:
+            self._held[job_id] = worker
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._renew_leases, name='jobqueue-heartbeat', daemon=True)
+                self._heartbeat.start()
+
+    def _release(self, job_id):
+        with self._held_lock:
+            self._held.pop(job_id, None)
+
+    def _renew_leases(self):
+        # 定期为本实例持有的任务续租；任务已被其它领取者接管时停止续租
+        while not self._stopping.wait(max(self.lease / 3, 0.1)):
+            with self._held_lock:
+                held = list(self._held.items())
+            if not held:
+                continue
+            now = time.time()
+            try:
+                with self._transaction() as conn:
+                    lost = [job_id for job_id, worker in held if not conn.execute(
+                        'UPDATE jobs SET claimed = ? WHERE id = ? AND status = ? AND worker = ?',
+                        (now, job_id, RUNNING, worker)).rowcount]
+            except sqlite3.Error as e:
+                print(f"任务续租失败: {e}")
+                continue
+            for job_id in lost:
+                self._release(job_id)
+
+    def _update_owned(self, job_id, worker, assignments, params):
+        # 仅当任务仍由worker持有（running且领取者未变）时更新；worker为空时不校验
+        query = f'UPDATE jobs SET {assignments}, updated = ? WHERE id = ?'
+        params = params + (time.time(), job_id)
+        if worker is not None:
+            query += ' AND status = ? AND worker = ?'
+            params += (RUNNING, worker)
+        with self._transaction() as conn:
+            return conn.execute(query, params).rowcount > 0
+
+    def save_content(self, job_id, content, worker=None):
+        """
+        持久化API返回的内容，须在构建文档之前调用
+        Returns:
+            是否写入（任务已被其它领取者接管时为False）
+        """
+        return self._update_owned(job_id, worker, 'content = ?', (_encode_content(content),))
+
+    def set_output(self, job_id, output, worker=None):
+        """
+        记录为任务预留的输出路径，须在构建文档之前调用；
+        构建后、complete()前中断的任务续跑时写回同一路径，不会产生带序号的重复文件
+        """
+        return self._update_owned(job_id, worker, 'output = ?', (output,))
+
+    def complete(self, job_id, output, worker=None):
+        """
+        标记任务完成
+        Args:
+            worker: 领取者标识（claim()返回的worker），给出时仅在任务仍由其持有时更新
+        Returns:
+            是否更新（租约已被其它领取者接管时为False，不覆盖新领取者的结果）
+        """
+        self._release(job_id)
+        return self._update_owned(job_id, worker, 'status = ?, output = ?, error = NULL', (DONE, output))
+
+    def fail(self, job_id, error, worker=None):
+        """
+        标记任务失败，worker与返回值同complete()
+        """
+        self._release(job_id)
+        return self._update_owned(job_id, worker, 'status = ?, error = ?', (FAILED, error))
+
+    def retry_failed(self):
+        """
+        将失败任务重新置为待处理，已保存的生成内容保留复用
+        Returns:
+            重置的任务数
+        """
+        with self._transaction() as conn:
+            return conn.execute('UPDATE jobs SET status = ?, error = NULL, updated = ? WHERE status = ?',
+                                (PENDING, time.time(), FAILED)).rowcount
+
+    def remaining(self):
+        """
+        当前可领取的任务数（待处理与租约过期的running任务）
+        """
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM jobs WHERE status = ? OR (status = ? AND claimed < ?)',
+                (PENDING, RUNNING, time.time() - self.lease)
+            ).fetchone()[0]
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        counts.update(rows)
+        return counts
+
+    def jobs(self, status=None):
+        """
+        列出任务记录（不含生成内容），可按状态筛选
+        """
+        query = 'SELECT id, prompt, status, output, error, attempts, content IS NOT NULL FROM jobs'
+        params = ()
+        if status:
+            query += ' WHERE status = ?'
+            params = (status,)
+        with self._lock:
+            rows = self._conn.execute(query + ' ORDER BY id', params).fetchall()
+        keys = ('id', 'prompt', 'status', 'output', 'error', 'attempts', 'generated')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def close(self):
+        self._stopping.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,244 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from batch import BatchRunner
+from cache import ResponseCache
+from client import CompletionClient
+from core import AIDocWriter
+from metrics import percentile, quiet
+from stubserver import StubCompletionServer
+
+MODES = ('generate', 'document', 'stream', 'batch')
+
+
+def synthetic_reply(paragraphs):
+    # 模拟AI回复：夹杂加粗符号与冒号段落
+    lines = []
+    for i in range(paragraphs):
+        text = f'第{i}段：这是用于负载测试的示例内容，包含中文与English混排。'
+        lines.append(f'**要点{i}** {text}' if i % 3 == 0 else text)
+    return '\n'.join(lines)
+
+
+class LoadTest:
+    """
+    离线负载测试：以固定并发（闭环，每个工作线程完成一个请求后立即发出下一个）驱动写入流程，
+    统计吞吐量、延迟分位数与错误率
+    模式：
+        generate  仅generate_content
+        document  generate_content + create_document
+        stream    generate_content_stream流式生成并同时构建文档
+        batch     经BatchRunner批量生成（含重试与汇总逻辑）
+    Args:
+        writer: AIDocWriter实例（应已指向测试用接口并关闭回复缓存）
+        mode: 测试模式
+        concurrency: 并发数
+        output_dir: 文档输出目录
+    """
+
+    def __init__(self, writer, mode='document', concurrency=8, output_dir='.'):
+        if mode not in MODES:
+            raise ValueError(f'未知的测试模式: {mode}')
+        self.writer = writer
+        self.mode = mode
+        self.concurrency = max(1, concurrency)
+        self.output_dir = output_dir
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def _prompt(self):
+        # 每个请求使用不同的提示词，避免被缓存或请求合并
+        with self._lock:
+            self._counter += 1
+            return f'负载测试文档{self._counter}', self._counter
+
+    def run_once(self):
+        """
+        执行一次操作
+        Returns:
+            (耗时秒数, 错误类型)，成功时错误类型为None
+        """
+        prompt, index = self._prompt()
+        filename = os.path.join(self.output_dir, f'load_{index}.docx')
+        start = time.perf_counter()
+        try:
+            if self.mode == 'stream':
+                paragraphs = self.writer.generate_content_stream(prompt, use_cache=False)
+                self.writer.output.wait(self.writer.create_document(paragraphs, filename))
+            else:
+                content = self.writer.generate_content(prompt, use_cache=False)
+                if not content:
+                    # generate_content在请求失败时返回None
+                    return time.perf_counter() - start, 'RequestFailed'
+                if self.mode == 'document':
+                    self.writer.output.wait(self.writer.create_document(content, filename, spacing_enabled=True))
+        except Exception as e:
+            return time.perf_counter() - start, type(e).__name__
+        return time.perf_counter() - start, None
+
+    def run(self, total):
+        """
+        执行total次操作并汇总
+        """
+        if self.mode == 'batch':
+            return self._run_batch(total)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            outcomes = list(pool.map(lambda _: self.run_once(), range(total)))
+        return self.summarize(outcomes, time.perf_counter() - start)
+
+    def _run_batch(self, total):
+        items = [{'prompt': self._prompt()[0], 'output': f'batch_{i}.docx'} for i in range(total)]
+        runner = BatchRunner(self.writer, self.output_dir, concurrency=self.concurrency, retries=0)
+        start = time.perf_counter()
+        summary = runner.run(items)
+        outcomes = [((r['generate'] or 0.0) + (r['build'] or 0.0),
+                     r['error'].split(':')[0] if r['error'] else None) for r in summary['items']]
+        return self.summarize(outcomes, time.perf_counter() - start)
+
+    def summarize(self, outcomes, elapsed):
+        latencies = [seconds for seconds, error in outcomes if error is None]
+        errors = Counter(error for _, error in outcomes if error is not None)
+        counters = self.writer.metrics.snapshot()['counters']
+        total = len(outcomes)
+        return {
+            'mode': self.mode,
+            'concurrency': self.concurrency,
+            'requests': total,
+            'succeeded': len(latencies),
+            'failed': total - len(latencies),
+            'error_rate': (total - len(latencies)) / total if total else 0.0,
+            'errors': dict(errors),
+            'elapsed': elapsed,
+            'throughput': len(latencies) / elapsed if elapsed else 0.0,
+            'latency': {
+                'mean': sum(latencies) / len(latencies) if latencies else 0.0,
+                'p50': percentile(latencies, 50),
+                'p95': percentile(latencies, 95),
+                'p99': percentile(latencies, 99),
+                'max': max(latencies) if latencies else 0.0,
+            },
+            # requests为客户端调用数，每次调用内的重试另计request_retries，两者之和为实际发出的HTTP请求数；
+            # request_errors为重试耗尽后最终失败的调用数
+            'http': {
+                'calls': counters.get('requests', 0),
+                'retries': counters.get('request_retries', 0),
+                'requests': counters.get('requests', 0) + counters.get('request_retries', 0),
+                'errors': counters.get('request_errors', 0),
+            },
+        }
+
+
+def compare(report, baseline, threshold):
+    """
+    与历史报告比较，返回超过阈值的回退描述列表：延迟分位数变慢或吞吐量下降
+    """
+    regressions = []
+    for pct in ('p50', 'p95', 'p99'):
+        current, previous = report['latency'][pct], baseline.get('latency', {}).get(pct)
+        if previous and current / previous > threshold:
+            regressions.append(f'{pct}延迟 {previous * 1000:.1f} -> {current * 1000:.1f} ms')
+    previous = baseline.get('throughput')
+    if previous and report['throughput'] * threshold < previous:
+        regressions.append(f"吞吐量 {previous:.2f} -> {report['throughput']:.2f} 次/秒")
+    return regressions
+
+
+def print_report(report):
+    latency = report['latency']
+    print(f"模式: {report['mode']}  并发: {report['concurrency']}  请求: {report['requests']}  "
+          f"成功: {report['succeeded']}  失败: {report['failed']}  错误率: {report['error_rate']:.2%}")
+    print(f"耗时: {report['elapsed']:.2f}s  吞吐量: {report['throughput']:.2f} 次/秒")
+    print(f"延迟: mean={latency['mean'] * 1000:.1f}ms p50={latency['p50'] * 1000:.1f}ms "
+          f"p95={latency['p95'] * 1000:.1f}ms p99={latency['p99'] * 1000:.1f}ms max={latency['max'] * 1000:.1f}ms")
+    http = report['http']
+    print(f"HTTP请求: {http['requests']}（调用 {http['calls']}，重试 {http['retries']}）  最终失败: {http['errors']}")
+    if report['errors']:
+        print('错误分布: ' + ', '.join(f'{name}={count}' for name, count in report['errors'].items()))
+    if report.get('stub'):
+        print('桩服务: ' + ', '.join(f'{name}={count}' for name, count in sorted(report['stub'].items())))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='基于本地桩服务的离线负载测试，报告吞吐量、延迟分位数与错误率')
+    parser.add_argument('--mode', choices=MODES, default='document', help='测试模式')
+    parser.add_argument('-n', '--requests', type=int, default=200, help='总请求数')
+    parser.add_argument('-c', '--concurrency', type=int, default=8, help='并发数')
+    parser.add_argument('--warmup', type=int, default=2, help='预热请求数（不计入结果）')
+    parser.add_argument('--api-base', help='压测已有的接口地址（如独立运行的stubserver.py），为空时启动进程内桩服务')
+    parser.add_argument('--output-dir', help='保留生成的文档到该目录，为空时使用临时目录')
+    parser.add_argument('--config', default='config.ini', help='配置文件，[Client]节的超时与重试参数对测试生效')
+    stub_group = parser.add_argument_group('进程内桩服务')
+    stub_group.add_argument('--paragraphs', type=int, default=50, help='每次回复的段落数')
+    stub_group.add_argument('--latency', default='uniform:0.05,0.2', help='首字节延迟分布，格式见stubserver.parse_latency')
+    stub_group.add_argument('--tokens-per-second', type=float, default=0.0, help='模拟生成速率，0表示不限速')
+    stub_group.add_argument('--chunk-size', type=int, default=16, help='流式分片字符数')
+    stub_group.add_argument('--rate-limit-rate', type=float, default=0.0, help='返回429的请求比例')
+    stub_group.add_argument('--server-error-rate', type=float, default=0.0, help='返回503的请求比例')
+    stub_group.add_argument('--timeout-rate', type=float, default=0.0, help='挂起后断开连接的请求比例')
+    stub_group.add_argument('--timeout-seconds', type=float, default=5.0, help='注入超时的挂起时长（秒）')
+    stub_group.add_argument('--seed', type=int, help='随机数种子')
+    parser.add_argument('--report', help='将报告写入JSON文件')
+    parser.add_argument('--compare', help='与历史JSON报告比较')
+    parser.add_argument('--threshold', type=float, default=1.2, help='判定为性能回退的倍数')
+    args = parser.parse_args(argv)
+
+    stub = None
+    api_base = args.api_base
+    if not api_base:
+        stub = StubCompletionServer(
+            synthetic_reply(args.paragraphs), chunk_size=args.chunk_size, latency=args.latency,
+            tokens_per_second=args.tokens_per_second, rate_limit_rate=args.rate_limit_rate,
+            server_error_rate=args.server_error_rate, timeout_rate=args.timeout_rate,
+            timeout_seconds=args.timeout_seconds, seed=args.seed, keep_requests=0,
+        ).start()
+        api_base = stub.api_base
+
+    writer = AIDocWriter(args.config)
+    writer.api_base = api_base
+    writer.cache = ResponseCache(enabled=False)
+    writer.client = CompletionClient.from_config(writer.config, api_base, 'loadtest', metrics=writer.metrics,
+                                                 pool_size=max(args.concurrency, 1))
+    try:
+        with contextlib.ExitStack() as stack:
+            output_dir = args.output_dir or stack.enter_context(tempfile.TemporaryDirectory())
+            os.makedirs(output_dir, exist_ok=True)
+            test = LoadTest(writer, args.mode, args.concurrency, output_dir)
+            with quiet():
+                for _ in range(args.warmup):
+                    test.run_once()
+                writer.metrics.reset()
+                if stub is not None:
+                    stub.stats.clear()
+                report = test.run(args.requests)
+            writer.output.close()
+        if stub is not None:
+            report['stub'] = dict(stub.stats)
+    finally:
+        writer.client.close()
+        if stub is not None:
+            stub.stop()
+
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for line in regressions:
+            print(f'性能回退: {line}')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
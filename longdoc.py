@@ -0,0 +1,145 @@
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+OUTLINE_PROMPT = (
+    '请为主题《{topic}》的长篇文档拟定大纲，包含{chapters}个左右的一级章节，每章2-4个二级小节。'
+    '只输出JSON数组，不要输出其它内容，格式为：'
+    '[{{"title": "一级章节标题", "sections": ["二级小节标题", "..."]}}]'
+)
+SECTION_PROMPT = (
+    '你正在撰写主题为《{topic}》的长篇文档，完整大纲如下：\n{outline}\n'
+    '请撰写第{index}章「{chapter}」中「{section}」一节的正文。'
+    '只输出正文段落，不要输出任何标题，段落之间用换行分隔。'
+)
+CHAPTER_PROMPT = (
+    '你正在撰写主题为《{topic}》的长篇文档，完整大纲如下：\n{outline}\n'
+    '请撰写第{index}章「{chapter}」的正文。'
+    '只输出正文段落，不要输出任何标题，段落之间用换行分隔。'
+)
+
+_CHAPTER_RE = re.compile(r'^(?:#\s*|第.+?[章部分]\s*|[一二三四五六七八九十]+[、.]\s*|\d+[、.]\s*(?!\d))')
+_SECTION_RE = re.compile(r'^(?:##+\s*|\d+\.\d+[.、]?\s*|[（(][一二三四五六七八九十\d]+[)）]\s*)')
+
+
+def parse_outline(text):
+    """
+    解析大纲回复：优先按JSON数组解析，失败时按"#"/"##"或"1."/"1.1"编号逐行解析
+    Args:
+        text: 模型返回的大纲文本
+    Returns:
+        [(一级章节标题, [二级小节标题, ...]), ...]
+    """
+    start, end = text.find('['), text.rfind(']')
+    if start != -1 and end > start:
+        try:
+            data = json.loads(text[start:end + 1])
+            outline = []
+            for chapter in data:
+                if isinstance(chapter, str):
+                    outline.append((chapter.strip(), []))
+                elif chapter.get('title'):
+                    outline.append((chapter['title'].strip(),
+                                    [str(s).strip() for s in chapter.get('sections') or [] if str(s).strip()]))
+            if outline:
+                return outline
+        except (ValueError, AttributeError, TypeError):
+            pass
+
+    outline = []
+    for line in text.splitlines():
+        line = line.strip().strip('*').strip()
+        if not line:
+            continue
+        section = _SECTION_RE.match(line)
+        if section and outline:
+            outline[-1][1].append(line[section.end():].strip())
+            continue
+        chapter = _CHAPTER_RE.match(line)
+        if chapter:
+            outline.append((line[chapter.end():].strip() or line, []))
+    return outline
+
+
+class SectionedGenerator:
+    """
+    长文档分章节生成：先请求大纲，再并行请求各小节正文，按大纲顺序组装，
+    一级/二级标题分别使用Heading 1/Heading 2样式
+    Args:
+        writer: AIDocWriter实例
+        max_workers: 并行请求小节的最大并发数
+        chapters: 期望的一级章节数量
+        rule_set: 正文使用的过滤规则集
+    """
+
+    def __init__(self, writer, max_workers=4, chapters=5, rule_set=None):
+        self.writer = writer
+        self.max_workers = max_workers
+        self.chapters = chapters
+        self.rule_set = rule_set
+
+    def generate_outline(self, topic):
+        # 大纲需保持JSON原样，不做符号过滤；大纲与章节的提示词均由模板生成、彼此只差少量文字，
+        # 不复用近似重复的回复，否则不同主题的大纲或同一文档的不同章节会误用彼此的内容
+        text = self.writer.generate_content(OUTLINE_PROMPT.format(topic=topic, chapters=self.chapters),
+                                            rule_set='none', use_similar=False)
+        if not text:
+            raise RuntimeError('大纲生成失败：API返回空内容')
+        outline = parse_outline(text)
+        if not outline:
+            raise RuntimeError('大纲生成失败：无法解析大纲')
+        return outline
+
+    def _generate_section(self, prompt, title):
+        content = self.writer.generate_content(prompt, rule_set=self.rule_set, use_similar=False)
+        if not content:
+            raise RuntimeError(f'章节生成失败：{title}')
+        return content
+
+    def iter_document_items(self, topic, outline=None):
+        """
+        并行生成各小节正文，按大纲顺序产出create_document可接收的段落
+        前面的小节完成后即可开始构建文档，无需等待全部小节
+        Args:
+            topic: 文档主题
+            outline: 预先给定的大纲，为空时先请求模型生成
+        Returns:
+            生成器，产出(样式名, 文本)元组或正文文本
+        """
+        outline = outline or self.generate_outline(topic)
+        outline_text = '\n'.join(
+            f'{i}. {chapter}' + ''.join(f'\n  {i}.{j}. {section}' for j, section in enumerate(sections, 1))
+            for i, (chapter, sections) in enumerate(outline, 1)
+        )
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            plan = []
+            for index, (chapter, sections) in enumerate(outline, 1):
+                plan.append(('Heading 1', chapter, None))
+                if not sections:
+                    prompt = CHAPTER_PROMPT.format(topic=topic, outline=outline_text, index=index, chapter=chapter)
+                    plan.append((None, chapter, pool.submit(self._generate_section, prompt, chapter)))
+                for section in sections:
+                    prompt = SECTION_PROMPT.format(topic=topic, outline=outline_text, index=index,
+                                                   chapter=chapter, section=section)
+                    plan.append(('Heading 2', section, None))
+                    plan.append((None, section, pool.submit(self._generate_section, prompt, section)))
+
+            try:
+                for style_name, title, future in plan:
+                    if future is None:
+                        yield (style_name, title)
+                        continue
+                    for paragraph in future.result().split('\n'):
+                        yield paragraph
+            finally:
+                # 提前中断（异常或取消）时不再发出尚未开始的请求
+                for _, _, future in plan:
+                    if future is not None:
+                        future.cancel()
+
+    def create_document(self, topic, filename, outline=None, **kwargs):
+        """
+        生成长文档并保存，参数同AIDocWriter.create_document
+        """
+        return self.writer.create_document(self.iter_document_items(topic, outline), filename, **kwargs)
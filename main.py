@@ -1,127 +1,15 @@
-import requests
-from docx import Document
-from docx.shared import Pt
-from docx.oxml import parse_xml
-from docx.oxml.ns import qn, nsmap
-from configparser import ConfigParser
 import os
-import time
 from tkinter import *
 from tkinter import ttk, messagebox, colorchooser
 import threading
-from formatting import DocumentFormatter
-from line import LineFormatter  # 新增导入
-from word import ContentFilter  # 新增导入
+from writer import AIDocWriter
+from preview import read_preview
+from progress import GenerationTask
 from tkinter import filedialog
 
-class AIDocWriter:
-    def __init__(self):
-        self.config = ConfigParser()
-        self.config.read('config.ini')
-        
-        self.api_key = self.config.get('API', 'api_key')
-        self.model = self.config.get('API', 'model_name')
-        self.api_base = self.config.get('API', 'api_base')
-        self.font_name = self.config.get('Style', 'font_name', fallback='微软雅黑')
-        self.font_size = self.config.getint('Style', 'font_size', fallback=12)
-
-    def create_document(self, content, filename, font_name=None, font_size=None, bold=False, italic=False, template=None, spacing_enabled=False):
-        # 文件名冲突检测
-        base_name, ext = os.path.splitext(filename)
-        counter = 1
-        while os.path.exists(filename):
-            filename = f"{base_name}_{counter}{ext}"
-            counter += 1
-        if template and os.path.exists(template):
-            doc = Document(template)
-        else:
-            doc = Document()
-        
-        # 使用主文档的格式化器实例
-        formatter = DocumentFormatter(
-            font_name=font_name or self.font_name,
-            font_size=DocumentFormatter.configure_font(font_size) if font_size else self.font_size
-        )
-        
-        try:
-            # 清理段落装饰线时保留边框
-            line_formatter = LineFormatter(spacing_enabled=True)
-            for para in doc.paragraphs:
-                formatter.clean_decorative_lines(para._element.get_or_add_pPr(), keep_borders=True)
-                # 符号触发边框
-                if ':' in para.text:
-                    line_formatter.add_symbol_triggered_border(para, ':')
-                # 段落分割线
-                line_formatter.set_spacing_property(para)
-            
-            # 清理表格装饰线时保留边框
-            for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        formatter.clean_decorative_lines(cell._element.get_or_add_tcPr(), keep_borders=True)
-            
-            # 强制设置分节符类型为连续
-            for section in doc.sections:
-                section.start_type = 4  # 直接设置CONTINUOUS类型
-                sectPr = section._sectPr
-                type_elements = sectPr.xpath('./w:type')
-                if type_elements:
-                    type_element = type_elements[0]
-                    type_element.set(qn('w:val'), 'continuous')
-                else:
-                    type_element = parse_xml(f'<w:type xmlns:w="{nsmap["w"]}" w:val="continuous"/>')
-                    sectPr.append(type_element)
-            
-            # 清理残留的XML装饰元素
-            for element in doc.element.xpath('//*[contains(name(), "Bdr")]'):
-                element.getparent().remove(element)
-            
-        except Exception as e:
-            print(f"文档处理异常: {type(e).__name__} - {str(e)}\n发生位置: {e.__traceback__.tb_lineno if e.__traceback__ else '未知'}")
-            raise RuntimeError("文档生成失败，请检查模板格式") from e
-        
-        # 在文档末尾添加新内容
-        line_formatter = LineFormatter(spacing_enabled=spacing_enabled)
-        for para_text in content.split('\n'):
-            p = formatter.create_paragraph(doc, para_text, bold=bold, italic=italic)
-            # 添加间隔线
-            line_formatter.set_spacing_border(p)
-            line_formatter.set_spacing_property(p)
-        
-        # 统一清理所有分节符
-        for section in doc.sections:
-            section.start_type = 4  # 4对应CONTINUOUS类型
-        
-        doc.save(filename)
-        print(f"文档已保存至：{os.path.abspath(filename)}")
-        return filename
-
-    def generate_content(self, prompt):
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-
-        payload = {
-            "model": self.model,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.7
-        }
-
-        try:
-            response = requests.post(
-                f"{self.api_base}/chat/completions",
-                headers=headers,
-                json=payload
-            )
-            response.raise_for_status()
-            filtered_content = ContentFilter.filter_ai_symbols(response.json()['choices'][0]['message']['content'])
-            return filtered_content
-        except Exception as e:
-            print(f"API请求失败: {e}")
-            return None
-
 class AIDocApp:
+    POLL_INTERVAL = 100  # 进度轮询间隔（毫秒）
+
     def __init__(self):
         self.writer = AIDocWriter()
         
@@ -214,7 +102,7 @@ class AIDocApp:
         self.bold_var = BooleanVar()
         self.italic_var = BooleanVar()
         self.spacing_var = BooleanVar()
-        self.symbol_filter_var = BooleanVar()  # 新增间隔线状态变量
+        self.symbol_filter_var = BooleanVar(value=True)  # 符号过滤开关，关闭时使用'none'规则集
         ttk.Checkbutton(font_frame, text='B', command=self.toggle_bold, variable=self.bold_var).grid(row=0, column=4, padx=2)
         ttk.Checkbutton(font_frame, text='I', command=self.toggle_italic, variable=self.italic_var).grid(row=0, column=5, padx=2)
         ttk.Checkbutton(font_frame, text='间隔线', variable=self.spacing_var).grid(row=0, column=6, padx=2)
@@ -257,9 +145,14 @@ class AIDocApp:
 
         ttk.Button(template_frame, text='浏览模板', command=self.select_template).grid(row=0, column=2)
 
-        # 生成按钮
-        self.generate_button = Button(self.window, text='生成文档', command=self.generate_document)
-        self.generate_button.pack(pady=10, side=BOTTOM)
+        # 生成与取消按钮
+        button_frame = Frame(self.window)
+        button_frame.pack(pady=10, side=BOTTOM)
+        self.generate_button = Button(button_frame, text='生成文档', command=self.generate_document)
+        self.generate_button.grid(row=0, column=0, padx=5)
+        self.cancel_button = Button(button_frame, text='取消', command=self.cancel_generation, state=DISABLED)
+        self.cancel_button.grid(row=0, column=1, padx=5)
+        self.task = None
 
         # 状态标签
         self.status_label = Label(self.window, text='', fg='black')
@@ -275,6 +168,7 @@ class AIDocApp:
 
     def generate_document(self):
         self.generate_button.config(state=DISABLED)
+        self.cancel_button.config(state=NORMAL)
         self.status_label.config(text='生成中...', fg='blue')
         
         prompt = self.prompt_input.get('1.0', END).strip()
@@ -287,29 +181,64 @@ class AIDocApp:
             'template': self.template_entry.get()
         }
 
-        def api_thread():
-            try:
-                generated_content = self.writer.generate_content(self.prompt_input.get('1.0', END).strip())
-                if generated_content:
-                    filename = self.writer.create_document(generated_content, 'AI生成的文档.docx', **font_params)
-                    self.window.after(0, lambda: self.status_label.config(
-                        text=f'文档已生成: {os.path.abspath(filename)}',
-                        fg='green'
-                    ))
-                else:
-                    self.window.after(0, lambda: self.status_label.config(
-                        text='生成失败：API返回空内容',
-                        fg='red'
-                    ))
-            except Exception as e:
-                self.window.after(0, lambda e=e: self.status_label.config(
-                    text=f'生成失败：{str(e)}',
-                    fg='red'
-                ))
-            finally:
-                self.window.after(0, lambda: self.generate_button.config(state=NORMAL))
+        rule_set = None if self.symbol_filter_var.get() else 'none'
+
+        # 预览区改为实时显示生成内容
+        self._preview_path = None
+        self.preview_text.config(state=NORMAL)
+        self.preview_text.delete(1.0, END)
+        self.preview_text.config(state=DISABLED)
+
+        # 后台线程流式生成并构建文档，界面线程轮询事件队列更新进度，不阻塞主循环
+        self._progress = (0, 0)
+        self.task = GenerationTask(self.writer, prompt, 'AI生成的文档.docx', rule_set=rule_set, **font_params).start()
+        self.window.after(self.POLL_INTERVAL, self._poll_task, self.task)
 
-        threading.Thread(target=api_thread, daemon=True).start()
+    def cancel_generation(self):
+        if self.task is not None:
+            self.cancel_button.config(state=DISABLED)
+            self.status_label.config(text='正在取消...', fg='blue')
+            self.task.cancel()
+
+    def _poll_task(self, task):
+        texts = []
+        final = None
+        for kind, data in task.drain():
+            if kind == 'text':
+                texts.append(data)
+            elif kind == 'progress':
+                self._progress = data
+            elif kind in task.FINAL_EVENTS:
+                final = (kind, data)
+        if texts:
+            self.preview_text.config(state=NORMAL)
+            self.preview_text.insert(END, '\n'.join(texts) + '\n')
+            self.preview_text.see(END)
+            self.preview_text.config(state=DISABLED)
+
+        if final is None:
+            if not task.cancelled:
+                tokens, paragraphs = self._progress
+                self.status_label.config(
+                    text=f'生成中... 已接收约{tokens} tokens，已构建{paragraphs}段，用时{task.elapsed:.1f}秒',
+                    fg='blue'
+                )
+            self.window.after(self.POLL_INTERVAL, self._poll_task, task)
+            return
+
+        kind, data = final
+        if kind == 'done':
+            self.status_label.config(
+                text=f'文档已生成: {os.path.abspath(data)}（{self._progress[1]}段，用时{task.elapsed:.1f}秒）',
+                fg='green'
+            )
+        elif kind == 'cancelled':
+            self.status_label.config(text=f'已取消（用时{task.elapsed:.1f}秒）', fg='black')
+        else:
+            self.status_label.config(text=f'生成失败：{data}', fg='red')
+        self.task = None
+        self.generate_button.config(state=NORMAL)
+        self.cancel_button.config(state=DISABLED)
 
     
     def select_template(self):
@@ -329,17 +258,30 @@ class AIDocApp:
                 messagebox.showerror('错误', '模板文件不存在或路径错误')
 
     def update_preview(self, filepath):
-        try:
-            if not os.path.exists(filepath):
-                raise FileNotFoundError(f'文件 {filepath} 不存在')
-            doc = Document(filepath)
-            preview_content = '\n'.join([p.text for p in doc.paragraphs[:10]])
-            self.preview_text.config(state=NORMAL)
-            self.preview_text.delete(1.0, END)
-            self.preview_text.insert(END, preview_content + '\n...（预览截取前10段内容）')
-            self.preview_text.config(state=DISABLED)
-        except Exception as e:
-            messagebox.showerror('预览错误', f'无法读取模板文件: {str(e)}')
+        # 在后台线程中轻量读取模板前10段，避免大模板阻塞界面
+        self._preview_path = filepath
+
+        def preview_thread():
+            try:
+                if not os.path.exists(filepath):
+                    raise FileNotFoundError(f'文件 {filepath} 不存在')
+                paragraphs = read_preview(filepath, 10)
+            except Exception as e:
+                self.window.after(0, lambda e=e: messagebox.showerror('预览错误', f'无法读取模板文件: {str(e)}'))
+                return
+            self.window.after(0, lambda: self.show_preview(filepath, paragraphs))
+
+        threading.Thread(target=preview_thread, daemon=True).start()
+
+    def show_preview(self, filepath, paragraphs):
+        # 期间又选择了其他模板时丢弃过期结果
+        if filepath != self._preview_path:
+            return
+        preview_content = '\n'.join(paragraphs)
+        self.preview_text.config(state=NORMAL)
+        self.preview_text.delete(1.0, END)
+        self.preview_text.insert(END, preview_content + '\n...（预览截取前10段内容）')
+        self.preview_text.config(state=DISABLED)
 
 if __name__ == "__main__":
     app = AIDocApp()
@@ -0,0 +1,188 @@
+import io
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager, redirect_stdout
+
+logger = logging.getLogger('aidoc.metrics')
+
+
+class Metrics:
+    """
+    线程安全的阶段计时与计数器，可导出为JSON或Prometheus文本格式
+    阶段：request, filter, template_load, template_prepare, paragraph_build, save
+    计数：requests, request_errors, request_retries, tokens_in, tokens_out, paragraphs_built,
+          xml_elements_removed, bytes_written
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timers = {}
+        self.counters = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            timer = self.timers.setdefault(name, {'count': 0, 'sum': 0.0, 'max': 0.0})
+            timer['count'] += 1
+            timer['sum'] += seconds
+            timer['max'] = max(timer['max'], seconds)
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'timers': {name: dict(timer) for name, timer in self.timers.items()},
+                'counters': dict(self.counters),
+            }
+
+    def merge(self, snapshot):
+        """
+        合并另一个Metrics的snapshot()结果（如渲染子进程返回的计时与计数）
+        """
+        with self._lock:
+            for name, other in snapshot.get('timers', {}).items():
+                timer = self.timers.setdefault(name, {'count': 0, 'sum': 0.0, 'max': 0.0})
+                timer['count'] += other['count']
+                timer['sum'] += other['sum']
+                timer['max'] = max(timer['max'], other['max'])
+            for name, value in snapshot.get('counters', {}).items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self.timers.clear()
+            self.counters.clear()
+
+    def emit(self, event, **fields):
+        """
+        以单行JSON结构化日志输出一个事件（logger: aidoc.metrics，INFO级别）
+        """
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(dict(fields, event=event, ts=time.time()), ensure_ascii=False))
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self, prefix='aidoc'):
+        snapshot = self.snapshot()
+        lines = [
+            f'# HELP {prefix}_stage_seconds 各阶段耗时',
+            f'# TYPE {prefix}_stage_seconds summary',
+        ]
+        for name, timer in sorted(snapshot['timers'].items()):
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {timer["count"]}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {timer["sum"]:.6f}')
+        lines.append(f'# TYPE {prefix}_stage_seconds_max gauge')
+        for name, timer in sorted(snapshot['timers'].items()):
+            lines.append(f'{prefix}_stage_seconds_max{{stage="{name}"}} {timer["max"]:.6f}')
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'# TYPE {prefix}_{name}_total counter')
+            lines.append(f'{prefix}_{name}_total {value}')
+        return '\n'.join(lines) + '\n'
+
+
+class Profiler:
+    """
+    cProfile采样汇总器：每次profile()在当前线程单独采样，结束后合并到汇总结果，
+    可同时用于GUI后台线程与批量任务的工作线程
+    Python 3.12起同一时刻只能有一个活动的profiler，因此同一时刻只采样一个任务，
+    其它线程中并发执行的任务不采样（skipped记录跳过的次数）
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = threading.Lock()
+        self._stats = None
+        self.skipped = 0
+
+    @contextmanager
+    def profile(self):
+        # 仅开启采样时才导入，避免拖慢未开启采样的进程启动
+        import cProfile
+        import pstats
+
+        if not self._active.acquire(blocking=False):
+            with self._lock:
+                self.skipped += 1
+            yield
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # 已有其它采样或调试工具处于活动状态
+            self._active.release()
+            with self._lock:
+                self.skipped += 1
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            self._active.release()
+            with self._lock:
+                if self._stats is None:
+                    self._stats = pstats.Stats(profile)
+                else:
+                    self._stats.add(profile)
+
+    def dump(self, path):
+        with self._lock:
+            if self._stats is not None:
+                self._stats.dump_stats(path)
+
+    def summary(self, limit=20):
+        with self._lock:
+            if self._stats is None:
+                return ''
+            stream = io.StringIO()
+            self._stats.stream = stream
+            self._stats.sort_stats('cumulative').print_stats(limit)
+            return stream.getvalue()
+
+
+@contextmanager
+def maybe_profile(profiler):
+    # profiler为空时不采样
+    if profiler is None:
+        yield
+    else:
+        with profiler.profile():
+            yield
+
+
+def percentile(values, pct):
+    """
+    最近秩分位数，批量报告、负载测试与路由对冲阈值共用同一定义
+    Args:
+        values: 数值序列
+        pct: 分位（0~100）
+    Returns:
+        对应分位的样本值，序列为空时返回0.0
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+@contextmanager
+def quiet():
+    # 屏蔽被测代码中的print输出（如每个文档的保存提示），避免终端输出干扰计时
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, redirect_stdout(devnull):
+        yield
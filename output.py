@@ -0,0 +1,248 @@
+import io
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+
+def zip_options(compresslevel):
+    """
+    按压缩级别返回ZipFile的(compression, compresslevel)参数：
+    -1为zlib默认级别（与python-docx一致），0为不压缩（ZIP_STORED），1~9为指定的deflate级别
+    """
+    if compresslevel == 0:
+        return zipfile.ZIP_STORED, None
+    return zipfile.ZIP_DEFLATED, None if compresslevel < 0 else compresslevel
+
+
+class _ZipPkgWriter:
+    # 与python-docx的_ZipPkgWriter接口相同，可指定压缩级别
+    def __init__(self, pkg_file, compresslevel):
+        compression, level = zip_options(compresslevel)
+        self._zipf = zipfile.ZipFile(pkg_file, 'w', compression=compression, compresslevel=level)
+
+    def write(self, pack_uri, blob):
+        self._zipf.writestr(pack_uri.membername, blob)
+
+    def close(self):
+        self._zipf.close()
+
+
+def save_document(doc, target, compresslevel=-1):
+    """
+    保存python-docx文档，等同于doc.save(target)但可指定zip压缩级别
+    Args:
+        doc: python-docx文档
+        target: 输出路径或可写的二进制流
+        compresslevel: 压缩级别，见zip_options
+    """
+    from docx.opc.pkgwriter import PackageWriter
+
+    package = doc.part.package
+    parts = list(package.parts)
+    for part in parts:
+        part.before_marshal()
+    # 与PackageWriter.write相同的写入顺序，仅替换底层的zip写入器
+    phys_writer = _ZipPkgWriter(target, compresslevel)
+    try:
+        PackageWriter._write_content_types_stream(phys_writer, parts)
+        PackageWriter._write_pkg_rels(phys_writer, package.rels)
+        PackageWriter._write_parts(phys_writer, parts)
+    finally:
+        phys_writer.close()
+
+
+class OutputWriter:
+    """
+    文档输出：以O_EXCL原子地预留不冲突的文件名，写入同目录临时文件后重命名替换，
+    并发写入同一目录时不会互相覆盖，读取方也不会看到写了一半的文件；
+    可选写入内存缓冲区，或在后台I/O线程中写盘
+    Args:
+        compresslevel: zip压缩级别，见zip_options
+        background: 是否在后台I/O线程中写盘（文档先在调用线程序列化到内存）
+        max_pending: 后台模式下最多等待写盘的文档数，超出时阻塞调用方以限制内存
+        metrics: 可选的Metrics实例，记录后台写盘耗时
+    """
+
+    def __init__(self, compresslevel=-1, background=False, max_pending=4, metrics=None):
+        self.compresslevel = compresslevel
+        self.background = background
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._next_suffix = {}
+        self._pending = {}
+        self._slots = threading.Semaphore(max(1, max_pending))
+        self._executor = None
+
+    @classmethod
+    def from_config(cls, config, metrics=None):
+        section = 'Output'
+        return cls(
+            compresslevel=config.getint(section, 'compress_level', fallback=-1),
+            background=config.getboolean(section, 'background_io', fallback=False),
+            max_pending=config.getint(section, 'max_pending', fallback=4),
+            metrics=metrics,
+        )
+
+    def reserve(self, filename):
+        """
+        原子地预留不冲突的文件名：以O_CREAT|O_EXCL创建空的占位文件，已存在时依次尝试_1、_2……
+        同一进程内记住每个文件名已用到的序号，批量写入同名文件时不必每次从头探测
+        Returns:
+            预留的路径
+        """
+        base, ext = os.path.splitext(filename)
+        with self._lock:
+            counter = self._next_suffix.get(filename, 0)
+        while True:
+            candidate = f"{base}_{counter}{ext}" if counter else filename
+            try:
+                # 0o666经umask过滤后即为普通新建文件的权限，与直接保存文档时一致
+                fd = os.open(candidate, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+            except FileExistsError:
+                counter += 1
+                continue
+            os.close(fd)
+            with self._lock:
+                self._next_suffix[filename] = max(self._next_suffix.get(filename, 0), counter + 1)
+            return candidate
+
+    @staticmethod
+    def hold(path):
+        """
+        确保调用方此前已预留的路径存在占位文件：不存在时创建，已存在（含已写完的文档）时保持不变
+        用于续跑的任务写回上次预留的文件名，不再另加序号
+        """
+        os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o666))
+        return path
+
+    def write(self, filename, render, background=None, reserved=False):
+        """
+        写出文档
+        Args:
+            filename: 目标路径（重名时自动加序号），或可写的二进制流（内存模式，如io.BytesIO）
+            render: 以可写二进制流为参数、写入完整文档包的函数
+            background: 是否在后台写盘，为空时使用实例配置；流式写入应传False以保持内存有界
+            reserved: filename是否为已由reserve()预留的路径，为True时直接替换该文件
+        Returns:
+            (实际写入的路径或流, 字节数)
+        """
+        if hasattr(filename, 'write'):
+            start = filename.tell()
+            render(filename)
+            return filename, filename.tell() - start
+
+        background = self.background if background is None else background
+        path = self.hold(filename) if reserved else self.reserve(filename)
+        try:
+            if not background:
+                return path, self._commit(path, render)
+            buffer = io.BytesIO()
+            render(buffer)
+            data = buffer.getvalue()
+            self._submit(path, data)
+            return path, len(data)
+        except BaseException:
+            self._discard(path)
+            raise
+
+    def save(self, doc, filename, background=None, reserved=False):
+        """
+        保存python-docx文档，参数与返回值同write
+        """
+        return self.write(filename, lambda stream: save_document(doc, stream, self.compresslevel), background,
+                          reserved)
+
+    @staticmethod
+    def _commit(path, render):
+        # 写入同目录的临时文件后原子替换占位文件；mkstemp创建的文件权限为0600，
+        # 替换前改为占位文件的权限（即按umask新建文件的权限），保证其它用户与服务可读
+        directory, name = os.path.split(path)
+        fd, tmp = tempfile.mkstemp(prefix=f'.{name}.', suffix='.tmp', dir=directory or '.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                render(f)
+                size = f.tell()
+            os.chmod(tmp, os.stat(path).st_mode & 0o777)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return size
+
+    @staticmethod
+    def _discard(path):
+        # 写入失败时删除占位文件，释放预留的文件名
+        if os.path.exists(path) and not os.path.getsize(path):
+            os.remove(path)
+
+    def _submit(self, path, data):
+        self._slots.acquire()
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='aidoc-io')
+            future = self._executor.submit(self._write_bytes, path, data)
+            self._pending[path] = future
+        future.add_done_callback(lambda f: self._written(path, f))
+
+    def _write_bytes(self, path, data):
+        start = time.perf_counter()
+        try:
+            self._commit(path, lambda f: f.write(data))
+        except BaseException:
+            self._discard(path)
+            raise
+        if self.metrics is not None:
+            self.metrics.observe('disk_write', time.perf_counter() - start)
+
+    def _written(self, path, future):
+        self._slots.release()
+        if future.exception() is None:
+            with self._lock:
+                if self._pending.get(path) is future:
+                    del self._pending[path]
+        else:
+            # 失败的写入保留在待处理表中，由wait/flush抛出
+            print(f"后台写入失败: {path}: {future.exception()}")
+
+    def wait(self, path):
+        """
+        等待指定路径的后台写入完成，写入失败时抛出对应异常；非后台写入的路径直接返回
+        """
+        with self._lock:
+            future = self._pending.get(path)
+        if future is None:
+            return
+        try:
+            future.result()
+        finally:
+            with self._lock:
+                if self._pending.get(path) is future:
+                    del self._pending[path]
+
+    def flush(self):
+        """
+        等待全部后台写入完成，有写入失败时抛出第一个异常
+        """
+        with self._lock:
+            paths = list(self._pending)
+        error = None
+        for path in paths:
+            try:
+                self.wait(path)
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            with self._lock:
+                executor, self._executor = self._executor, None
+            if executor is not None:
+                executor.shutdown(wait=True)
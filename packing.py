@@ -0,0 +1,163 @@
+import json
+
+from client import estimate_tokens
+
+PACKED_PROMPT = (
+    '下面有{count}个相互独立的写作任务，请逐个完成，每个任务的正文互不引用。\n'
+    '只输出一个JSON对象，不要输出其它内容。键为任务编号（字符串），值为该任务的完整正文，'
+    '正文段落之间用换行符分隔，格式为：{{"1": "任务1的正文", "2": "任务2的正文"}}\n\n'
+    '{tasks}'
+)
+TASK_FORMAT = '任务{index}：{prompt}'
+
+
+def build_packed_prompt(prompts):
+    tasks = '\n\n'.join(TASK_FORMAT.format(index=i, prompt=prompt) for i, prompt in enumerate(prompts, 1))
+    return PACKED_PROMPT.format(count=len(prompts), tasks=tasks)
+
+
+def parse_packed(text, count):
+    """
+    解析合并请求的JSON回复，按任务编号拆分
+    Args:
+        text: 模型回复（可带有代码块标记等多余内容）
+        count: 任务数
+    Returns:
+        长度为count的列表，缺失、为空或无法解析的任务为None
+    """
+    results = [None] * count
+    start, end = text.find('{'), text.rfind('}')
+    if start == -1 or end <= start:
+        return results
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError:
+        return results
+    if not isinstance(data, dict):
+        return results
+    for key, value in data.items():
+        try:
+            index = int(str(key).strip().lstrip('任务')) - 1
+        except ValueError:
+            continue
+        # 部分模型会把正文写成段落数组
+        if isinstance(value, list):
+            value = '\n'.join(str(v) for v in value)
+        if 0 <= index < count and isinstance(value, str) and value.strip():
+            results[index] = value.strip()
+    return results
+
+
+class PromptPacker:
+    """
+    短文档合并请求：按本地估算的token预算把多个短提示词装入同一个请求，
+    要求模型以JSON对象按编号返回各文档正文，再拆分回每个文档；
+    拆分失败的文档返回None，由调用方改为单独请求
+    Args:
+        writer: AIDocWriter实例
+        context_tokens: 单个合并请求的上下文预算（提示词与预计回复之和）
+        output_tokens: 单个合并请求的回复token上限
+        doc_tokens: 每篇短文档预计的回复token数
+        max_prompt_tokens: 可参与合并的单个提示词token上限，超出的单独请求
+        max_items: 单个合并请求最多包含的文档数
+        metrics: 可选的Metrics实例，记录合并请求数、合并文档数与回退次数
+    """
+
+    def __init__(self, writer, context_tokens=8000, output_tokens=4000, doc_tokens=500, max_prompt_tokens=300,
+                 max_items=8, metrics=None):
+        self.writer = writer
+        self.context_tokens = context_tokens
+        self.output_tokens = output_tokens
+        self.doc_tokens = doc_tokens
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_items = max(1, max_items)
+        self.metrics = metrics
+        self.overhead = estimate_tokens(PACKED_PROMPT.format(count=self.max_items, tasks=''))
+
+    @classmethod
+    def from_config(cls, config, writer, metrics=None, **overrides):
+        section = 'Packing'
+        options = dict(
+            context_tokens=config.getint(section, 'context_tokens', fallback=8000),
+            output_tokens=config.getint(section, 'output_tokens', fallback=4000),
+            doc_tokens=config.getint(section, 'doc_tokens', fallback=500),
+            max_prompt_tokens=config.getint(section, 'max_prompt_tokens', fallback=300),
+            max_items=config.getint(section, 'max_items', fallback=8),
+            metrics=metrics,
+        )
+        options.update((key, value) for key, value in overrides.items() if value)
+        return cls(writer, **options)
+
+    @staticmethod
+    def enabled(config):
+        return config.getboolean('Packing', 'enabled', fallback=False)
+
+    def _record(self, name, value=1):
+        if self.metrics is not None:
+            self.metrics.incr(name, value)
+
+    def _cost(self, prompt):
+        return estimate_tokens(TASK_FORMAT.format(index=self.max_items, prompt=prompt)) + self.doc_tokens
+
+    def plan(self, prompts):
+        """
+        按原顺序贪心分组：组内提示词与预计回复之和不超过context_tokens，
+        预计回复不超过output_tokens，文档数不超过max_items；过长的提示词单独成组
+        Returns:
+            [[提示词下标, ...], ...]
+        """
+        groups, current, used = [], [], self.overhead
+        for index, prompt in enumerate(prompts):
+            if estimate_tokens(prompt) > self.max_prompt_tokens:
+                groups.append([index])
+                continue
+            cost = self._cost(prompt)
+            if current and (len(current) >= self.max_items or used + cost > self.context_tokens
+                            or (len(current) + 1) * self.doc_tokens > self.output_tokens):
+                groups.append(current)
+                current, used = [], self.overhead
+            current.append(index)
+            used += cost
+        if current:
+            groups.append(current)
+        return groups
+
+    def _cache_key(self, prompt):
+        return self.writer._cache_key(self.writer._build_payload(prompt))
+
+    def generate_group(self, prompts, rule_sets=None):
+        """
+        以一个合并请求生成多篇文档，已缓存的提示词直接使用缓存
+        拆分成功的正文按各自的提示词写入回复缓存，之后单独请求同一提示词时可直接命中
+        Args:
+            prompts: 提示词列表
+            rule_sets: 与prompts对应的过滤规则集名列表，为空时使用默认规则集
+        Returns:
+            与prompts对应的过滤后正文列表，合并请求失败或拆分失败的为None
+        """
+        rule_sets = rule_sets or [None] * len(prompts)
+        keys = [self._cache_key(prompt) for prompt in prompts]
+        raw = [self.writer.cache.get(key) for key in keys]
+        missing = [i for i, content in enumerate(raw) if content is None]
+        if len(missing) > 1:
+            # 合并请求直接经client发出：回复须保持JSON原样不做符号过滤，且合并回复本身不写入缓存、
+            # 不加入近似重复索引（只差一个任务的合并请求不应复用旧回复），只缓存拆分后的各文档；
+            # max_tokens按output_tokens显式指定，避免后端默认的回复上限截断JSON
+            payload = self.writer._build_payload(build_packed_prompt([prompts[i] for i in missing]))
+            payload['max_tokens'] = self.output_tokens
+            try:
+                reply = self.writer.client.chat(payload)
+            except Exception as e:
+                print(f"合并请求失败: {e}")
+                reply = ''
+            parts = parse_packed(reply or '', len(missing))
+            self._record('packed_requests')
+            for i, part in zip(missing, parts):
+                if part is None:
+                    self._record('packing_fallbacks')
+                    continue
+                raw[i] = part
+                self.writer.cache.set(keys[i], part)
+                self._record('packed_documents')
+        return [self.writer.get_filter(rule_set).filter(content) if content else None
+                for content, rule_set in zip(raw, rule_sets)]
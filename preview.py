@@ -0,0 +1,70 @@
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+from xml.etree.ElementTree import iterparse
+
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+BODY, P, R = f'{W}body', f'{W}p', f'{W}r'
+RUN_TEXT = {f'{W}t': None, f'{W}tab': '\t', f'{W}br': '\n', f'{W}cr': '\n'}
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+CACHE_SIZE = 32
+
+
+def _paragraph_text(p):
+    # 与python-docx的Paragraph.text一致：只取段落直接子级w:r中的文本
+    parts = []
+    for run in p.iterfind(R):
+        for child in run:
+            if child.tag not in RUN_TEXT:
+                continue
+            text = RUN_TEXT[child.tag]
+            parts.append((child.text or '') if text is None else text)
+    return ''.join(parts)
+
+
+def _read_paragraphs(path, limit):
+    paragraphs = []
+    stack = []
+    with zipfile.ZipFile(path) as package, package.open('word/document.xml') as f:
+        for event, elem in iterparse(f, events=('start', 'end')):
+            if event == 'start':
+                stack.append(elem.tag)
+                continue
+            stack.pop()
+            if not stack or stack[-1] != BODY:
+                continue
+            # 仅统计正文直接子级段落（与doc.paragraphs一致），处理后释放已解析的节点
+            if elem.tag == P:
+                paragraphs.append(_paragraph_text(elem))
+                if len(paragraphs) >= limit:
+                    break
+            elem.clear()
+    return paragraphs
+
+
+def read_preview(path, limit=10):
+    """
+    轻量读取模板前limit段正文：直接解压word/document.xml并流式解析，
+    读满limit段即停止，不加载样式、编号与媒体文件；结果按路径与修改时间缓存
+    Args:
+        path: .docx文件路径
+        limit: 读取的段落数
+    Returns:
+        段落文本列表
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, limit)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return list(_cache[key])
+
+    paragraphs = _read_paragraphs(path, limit)
+    with _cache_lock:
+        _cache[key] = tuple(paragraphs)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return paragraphs
@@ -0,0 +1,131 @@
+import os
+import queue
+import threading
+import time
+
+from client import abort_response, estimate_tokens
+from metrics import maybe_profile
+
+
+class GenerationCancelled(Exception):
+    pass
+
+
+class GenerationTask:
+    """
+    后台生成任务：流式请求内容并边接收边构建文档，进度以事件写入队列，
+    由界面线程定时取出（tkinter组件只能在主线程中更新）
+    事件为(类型, 数据)元组：
+        ('text', 段落)          过滤后的段落，用于实时预览
+        ('progress', (已接收token数, 已构建段落数))
+        ('done', 输出路径) / ('error', 错误信息) / ('cancelled', None)  任务结束
+    Args:
+        writer: AIDocWriter实例
+        prompt: 文档主题
+        filename: 输出文件名
+        rule_set: 过滤规则集名
+        **doc_kwargs: 传给create_document的参数
+    """
+
+    FINAL_EVENTS = ('done', 'error', 'cancelled')
+
+    def __init__(self, writer, prompt, filename, rule_set=None, **doc_kwargs):
+        self.writer = writer
+        self.prompt = prompt
+        self.filename = filename
+        self.rule_set = rule_set
+        self.doc_kwargs = doc_kwargs
+        self.events = queue.Queue()
+        self.tokens = 0
+        self.paragraphs = 0
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._response = None
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def start(self):
+        self.started = time.perf_counter()
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def cancel(self):
+        """
+        取消任务：立即中止进行中的HTTP响应，文档构建在下一个段落处停止且不保存
+        """
+        self._cancel.set()
+        with self._lock:
+            response = self._response
+        if response is not None:
+            abort_response(response)
+
+    def drain(self, limit=500):
+        """
+        非阻塞地取出至多limit个事件
+        """
+        events = []
+        while len(events) < limit:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def _on_response(self, response):
+        with self._lock:
+            self._response = response
+        # 等待响应头期间已被取消
+        if self._cancel.is_set():
+            abort_response(response)
+
+    def _track(self, paragraphs):
+        # 逐段转发给create_document，同时报告进度并检查取消
+        for text in paragraphs:
+            if self._cancel.is_set():
+                raise GenerationCancelled()
+            self.tokens += estimate_tokens(text)
+            self.events.put(('text', text))
+            yield text
+            # create_document取下一段时上一段已构建完成
+            self.paragraphs += 1
+            self.events.put(('progress', (self.tokens, self.paragraphs)))
+        if self._cancel.is_set():
+            raise GenerationCancelled()
+
+    def _run(self):
+        profiler = self.writer.profiler
+        with maybe_profile(profiler):
+            result = self._generate()
+        self.finished = time.perf_counter()
+        self.events.put(result)
+        if profiler is not None:
+            profiler.dump(self.writer.profile_output)
+
+    def _generate(self):
+        paragraphs = None
+        try:
+            paragraphs = self.writer.generate_content_stream(self.prompt, rule_set=self.rule_set,
+                                                             on_response=self._on_response)
+            filename = self.writer.create_document(self._track(paragraphs), self.filename, **self.doc_kwargs)
+            self.writer.output.wait(filename)
+        except Exception as e:
+            if self._cancel.is_set():
+                return 'cancelled', None
+            return 'error', str(e)
+        finally:
+            if paragraphs is not None:
+                paragraphs.close()
+        if not self.paragraphs:
+            os.remove(filename)
+            return 'error', 'API返回空内容'
+        return 'done', filename
@@ -0,0 +1,144 @@
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块，不支持内存上限
+    resource = None
+
+from core import AIDocWriter
+
+# 渲染子进程内的AIDocWriter实例，由_init_worker创建
+_writer = None
+
+
+def _init_worker(templates, memory_limit):
+    global _writer
+    if memory_limit and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    _writer = AIDocWriter()
+    # 预热：子进程启动时即完成模板规范化，首个任务无需等待
+    for template in templates:
+        if template and os.path.exists(template):
+            _writer.templates.prepared_bytes(template)
+
+
+def _render(content, filename, kwargs):
+    _writer.metrics.reset()
+    output = _writer.create_document(content, filename, **kwargs)
+    _writer.output.wait(output)
+    return output, _writer.metrics.snapshot()
+
+
+class RenderPool:
+    """
+    多进程文档渲染池：python-docx构建与保存（lxml序列化与zip压缩）为CPU密集型，
+    在多个子进程中执行以绕过GIL；每个子进程持有自己的预处理模板缓存
+    Args:
+        workers: 子进程数，0或为空时使用CPU核数
+        templates: 子进程启动时预热的模板路径
+        memory_limit_mb: 单个子进程的虚拟内存上限（MB，仅类Unix系统），0表示不限
+        max_tasks_per_child: 子进程处理该数量的任务后重启以释放内存，0表示不重启（需Python 3.11及以上）
+        metrics: 可选的Metrics实例，合并子进程返回的各阶段计时与计数
+    """
+
+    def __init__(self, workers=None, templates=(), memory_limit_mb=0, max_tasks_per_child=0, metrics=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.templates = tuple(templates)
+        self.memory_limit = memory_limit_mb * 1024 * 1024 if memory_limit_mb else 0
+        self.max_tasks_per_child = max_tasks_per_child or None
+        if self.max_tasks_per_child and sys.version_info < (3, 11):
+            print('max_tasks_per_child需要Python 3.11及以上，已忽略该设置')
+            self.max_tasks_per_child = None
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._executor = self._create_executor()
+
+    @classmethod
+    def from_config(cls, config, metrics=None, **overrides):
+        # overrides中的参数（如命令行指定的workers、templates）优先于配置
+        section = 'Render'
+        templates = config.get(section, 'warm_templates', fallback='')
+        options = dict(
+            workers=config.getint(section, 'workers', fallback=0),
+            templates=[t.strip() for t in templates.split(',') if t.strip()],
+            memory_limit_mb=config.getint(section, 'memory_limit_mb', fallback=0),
+            max_tasks_per_child=config.getint(section, 'max_tasks_per_child', fallback=0),
+            metrics=metrics,
+        )
+        options.update((key, value) for key, value in overrides.items() if value)
+        return cls(**options)
+
+    def _create_executor(self):
+        # max_tasks_per_child参数仅Python 3.11及以上支持，未设置时不传；
+        # 设置后ProcessPoolExecutor使用spawn方式启动子进程
+        options = {}
+        if self.max_tasks_per_child:
+            options['max_tasks_per_child'] = self.max_tasks_per_child
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self.templates, self.memory_limit),
+            **options,
+        )
+
+    def _merge_metrics(self, future):
+        if self.metrics is not None and not future.cancelled() and future.exception() is None:
+            self.metrics.merge(future.result()[1])
+
+    def _submit(self, content, filename, kwargs):
+        with self._lock:
+            executor = self._executor
+        future = executor.submit(_render, content, filename, kwargs)
+        future.add_done_callback(self._merge_metrics)
+        return executor, future
+
+    def submit(self, content, filename, **kwargs):
+        """
+        提交渲染任务，参数同AIDocWriter.create_document
+        Returns:
+            Future，结果为(输出路径, 子进程计时与计数)
+        """
+        # 生成器无法跨进程传递，先展开为列表
+        if not isinstance(content, str):
+            content = list(content)
+        return self._submit(content, filename, kwargs)[1]
+
+    def _restart(self, broken):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = self._create_executor()
+
+    def create_document(self, content, filename, **kwargs):
+        """
+        在子进程中生成文档并等待完成，与AIDocWriter.create_document可互换使用
+        子进程异常退出（如超出内存上限被终止）时重建进程池并重试一次
+        Returns:
+            输出文件路径
+        """
+        if not isinstance(content, str):
+            content = list(content)
+        for attempt in range(2):
+            with self._lock:
+                executor = self._executor
+            try:
+                executor, future = self._submit(content, filename, kwargs)
+                return future.result()[0]
+            except BrokenProcessPool:
+                print('渲染子进程异常退出，重建进程池')
+                self._restart(executor)
+                if attempt:
+                    raise
+
+    def close(self):
+        with self._lock:
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
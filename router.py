@@ -0,0 +1,319 @@
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from client import CompletionClient
+from metrics import percentile
+
+BACKEND_PREFIX = 'Backend:'
+
+
+class Backend:
+    """
+    路由中的单个OpenAI兼容后端，记录最近window次请求的延迟与成败
+    非流式请求记录完整耗时，流式请求记录收到响应头的耗时，两者分开统计
+    Args:
+        name: 后端名
+        client: CompletionClient实例
+        model: 该后端使用的模型名，为空时沿用请求体中的model
+        weight: 权重，越大越优先
+        window: 滚动统计窗口大小
+    """
+
+    def __init__(self, name, client, model=None, weight=1.0, window=50):
+        self.name = name
+        self.client = client
+        self.model = model
+        self.weight = weight
+        self.latencies = {'chat': deque(maxlen=window), 'stream': deque(maxlen=window)}
+        self.outcomes = deque(maxlen=window)
+        self.in_flight = 0
+        self.failures = 0
+        self.cooldown_until = 0.0
+        self.next_probe = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, kind, seconds, ok, cooldown=0.0, max_failures=3):
+        with self._lock:
+            self.outcomes.append(ok)
+            if ok:
+                self.latencies[kind].append(seconds)
+                self.failures = 0
+            else:
+                # 连续失败达到上限后暂停分配请求一段时间
+                self.failures += 1
+                if self.failures >= max_failures:
+                    self.cooldown_until = time.monotonic() + cooldown
+
+    @property
+    def error_rate(self):
+        with self._lock:
+            return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def latency(self, kind, pct=50):
+        with self._lock:
+            values = list(self.latencies[kind])
+        return percentile(values, pct) if values else None
+
+    def samples(self, kind):
+        return len(self.latencies[kind])
+
+    def available(self):
+        return time.monotonic() >= self.cooldown_until
+
+    def score(self, kind):
+        """
+        预估代价，越小越优：中位延迟按进行中请求数放大、按错误率惩罚、按权重折算
+        从未请求过的后端代价为0，优先探测；没有成功样本且最近失败的后端代价为无穷大，
+        排在所有有样本的后端之后，只通过probe_due()以对冲方式探测
+        """
+        latency = self.latency(kind)
+        if latency is None:
+            return float('inf') if self.failures else 0.0
+        return latency * (1 + self.in_flight) * (1 + 4 * self.error_rate) / self.weight
+
+    def probe_due(self, kind, interval):
+        """
+        代价为无穷大的后端冷却结束后，每interval秒允许一次探测请求
+        """
+        if self.latency(kind) is not None or not self.failures or not self.available():
+            return False
+        with self._lock:
+            now = time.monotonic()
+            if now < self.next_probe:
+                return False
+            self.next_probe = now + interval
+            return True
+
+    def payload_for(self, payload):
+        return dict(payload, model=self.model) if self.model else payload
+
+    @contextmanager
+    def tracking(self, kind, cooldown=0.0, max_failures=3):
+        # 统计进行中的请求数，退出时按是否抛出异常记录耗时与成败；
+        # 取消等非Exception的中断不计为后端失败（同步与异步路径共用）
+        with self._lock:
+            self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.record(kind, time.perf_counter() - start, False, cooldown, max_failures)
+            raise
+        else:
+            self.record(kind, time.perf_counter() - start, True, cooldown, max_failures)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def call(self, kind, payload, cooldown=0.0, max_failures=3):
+        # kind为chat时返回回复文本，为stream时返回尚未读取正文的Response
+        with self.tracking(kind, cooldown, max_failures):
+            payload = self.payload_for(payload)
+            return self.client.chat(payload) if kind == 'chat' else self.client.open_stream(payload)
+
+
+class ModelRouter:
+    """
+    多后端路由：按滚动延迟与错误率选择最优后端，请求超过主后端的延迟分位数时
+    向次优后端发送对冲请求并采用先返回的结果，出错时依次故障转移到其它后端
+    对外提供与CompletionClient相同的chat()/stream()/open_stream()/iter_stream()接口
+    Args:
+        backends: Backend列表
+        hedge_percentile: 触发对冲的延迟分位数（如95），0表示不对冲
+        hedge_min_samples: 主后端样本数达到该值后才按分位数对冲
+        hedge_delay: 样本不足时的固定对冲等待（秒），0表示样本不足时不对冲
+        max_attempts: 单个请求最多尝试的后端数（含对冲）
+        cooldown: 后端连续失败max_failures次后暂停分配的秒数
+        max_failures: 触发暂停的连续失败次数
+        metrics: 可选的Metrics实例，记录对冲与故障转移次数
+    """
+
+    def __init__(self, backends, hedge_percentile=95, hedge_min_samples=10, hedge_delay=0.0,
+                 max_attempts=3, cooldown=30.0, max_failures=3, metrics=None):
+        if not backends:
+            raise ValueError('至少需要配置一个后端')
+        self.backends = list(backends)
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_delay = hedge_delay
+        self.max_attempts = max(1, max_attempts)
+        self.cooldown = cooldown
+        self.max_failures = max_failures
+        self.metrics = metrics
+        # 对冲请求与主请求同时进行，线程数按各后端连接池之和预留
+        self._executor = ThreadPoolExecutor(max_workers=sum(b.client.pool_size for b in self.backends))
+        # open_stream返回的响应所属的后端客户端，由iter_stream按响应取回
+        self._stream_clients = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def from_config(cls, config, api_key='', model=None, metrics=None):
+        """
+        从config.ini的[Backend:名称]节构建路由，路由参数见[Router]节
+        每个后端节可配置api_base、api_key、model_name、weight，以及覆盖[Client]节的连接参数
+        后端客户端默认不重试（max_retries不沿用[Client]节，需在后端节中显式配置），
+        由max_attempts在后端之间故障转移，避免单个故障后端耗尽退避重试后才切换或对冲
+        """
+        section = 'Router'
+        window = config.getint(section, 'window', fallback=50)
+        backends = []
+        for name in config.sections():
+            if not name.startswith(BACKEND_PREFIX):
+                continue
+            client = CompletionClient.from_config(
+                config, config.get(name, 'api_base'), config.get(name, 'api_key', fallback=api_key),
+                metrics=metrics, section=name,
+                max_retries=config.getint(name, 'max_retries', fallback=0),
+            )
+            backends.append(Backend(
+                name[len(BACKEND_PREFIX):], client,
+                model=config.get(name, 'model_name', fallback=model) or None,
+                weight=config.getfloat(name, 'weight', fallback=1.0),
+                window=window,
+            ))
+        return cls(
+            backends,
+            hedge_percentile=config.getfloat(section, 'hedge_percentile', fallback=95),
+            hedge_min_samples=config.getint(section, 'hedge_min_samples', fallback=10),
+            hedge_delay=config.getfloat(section, 'hedge_delay', fallback=0.0),
+            max_attempts=config.getint(section, 'max_attempts', fallback=3),
+            cooldown=config.getfloat(section, 'cooldown', fallback=30.0),
+            max_failures=config.getint(section, 'max_failures', fallback=3),
+            metrics=metrics,
+        )
+
+    @staticmethod
+    def configured(config):
+        return any(name.startswith(BACKEND_PREFIX) for name in config.sections())
+
+    def rank(self, kind='chat'):
+        """
+        按预估代价排序的后端列表，暂停中的后端排在最后
+        """
+        return sorted(self.backends, key=lambda b: (not b.available(), b.score(kind)))
+
+    @property
+    def primary(self):
+        # 当前最优后端的客户端，供无法逐请求路由的调用方（如异步写入器）使用
+        return self.rank()[0].client
+
+    def _hedge_after(self, backend, kind):
+        if not self.hedge_percentile:
+            return None
+        if backend.samples(kind) >= self.hedge_min_samples:
+            return backend.latency(kind, self.hedge_percentile)
+        return self.hedge_delay or None
+
+    def _probe(self, kind, primary):
+        for backend in self.backends:
+            if backend is not primary and backend.probe_due(kind, self.cooldown):
+                return backend
+        return None
+
+    def _record(self, name):
+        if self.metrics is not None:
+            self.metrics.incr(name)
+
+    @staticmethod
+    def _discard(future):
+        # 对冲中落败的流式响应需关闭以归还连接
+        if future.exception() is None and hasattr(future.result(), 'close'):
+            future.result().close()
+
+    def _route(self, kind, payload):
+        candidates = self.rank(kind)[:self.max_attempts]
+        pending = {}
+        error = None
+
+        def launch(backend=None):
+            if backend is None:
+                backend = candidates.pop(0)
+            elif backend in candidates:
+                candidates.remove(backend)
+            future = self._executor.submit(backend.call, kind, payload, self.cooldown, self.max_failures)
+            pending[future] = backend
+            return backend
+
+        primary = launch()
+        # 只失败过的后端不再作为主请求，冷却结束后随真实请求附带一次探测，先返回者胜出；
+        # 探测成功后该后端有了延迟样本，恢复正常排序
+        probe = self._probe(kind, primary)
+        if probe is not None:
+            self._record('router_probes')
+            launch(probe)
+        hedged = False
+
+        def waiting_on_probe_only():
+            return all(backend is probe for backend in pending.values())
+
+        while pending:
+            timeout = None
+            if not hedged and candidates:
+                timeout = self._hedge_after(primary, kind)
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # 主请求超过延迟分位数仍未返回，向次优后端发送对冲请求
+                hedged = True
+                self._record('router_hedges')
+                launch()
+                continue
+            for future in done:
+                backend = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    print(f"后端{backend.name}请求失败: {e}")
+                    # 仅剩探测请求时不等待探测结果，直接故障转移
+                    if candidates and waiting_on_probe_only():
+                        self._record('router_failovers')
+                        launch()
+                    continue
+                for loser in pending:
+                    loser.add_done_callback(self._discard)
+                return backend, result
+        raise error
+
+    def chat(self, payload):
+        """
+        发送非流式请求并返回回复文本
+        """
+        return self._route('chat', payload)[1]
+
+    def stream(self, payload):
+        """
+        发送流式请求，返回逐个产出增量文本的生成器
+        对冲与故障转移只作用于建立连接阶段，开始输出后不再切换后端
+        """
+        return self.iter_stream(self.open_stream(payload))
+
+    def open_stream(self, payload):
+        """
+        经路由发出流式请求，返回尚未读取正文的Response，由iter_stream读取
+        """
+        backend, response = self._route('stream', payload)
+        self._stream_clients[response] = backend.client
+        return response
+
+    def iter_stream(self, response):
+        return self._stream_clients.pop(response).iter_stream(response)
+
+    def stats(self):
+        return {
+            backend.name: {
+                'latency_p50': backend.latency('chat'),
+                'latency_p95': backend.latency('chat', 95),
+                'stream_p50': backend.latency('stream'),
+                'error_rate': backend.error_rate,
+                'available': backend.available(),
+            }
+            for backend in self.backends
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        for backend in self.backends:
+            backend.client.close()
@@ -0,0 +1,181 @@
+import io
+import os
+import re
+import time
+import uuid
+import zipfile
+
+from docx import Document
+from lxml import etree
+
+from formatting import DocumentFormatter
+from line import LineFormatter
+from output import zip_options
+
+DOCUMENT_PART = 'word/document.xml'
+# 正文片段在文档内序列化，根元素已声明命名空间，需去掉片段自带的声明
+_NSDECL_RE = re.compile(r' xmlns(?::\w+)?="[^"]*"')
+_TAG_RE = re.compile(r'<[^>]+>')
+_RUN_SPLIT_RE = re.compile(r'([\t\r\n])')
+# lxml拒绝写入的控制字符，与python-docx行为保持一致
+_INVALID_XML_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+FLUSH_BYTES = 1 << 16
+
+
+def _escape(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def run_content_xml(text):
+    """
+    生成与python-docx的run.text赋值相同的run内容XML：
+    连续普通字符为一个w:t（首尾有空白时保留空格），制表符为w:tab，换行/回车为w:br
+    """
+    if _INVALID_XML_RE.search(text):
+        raise ValueError('All strings must be XML compatible: Unicode or ASCII, no NULL bytes or control characters')
+    parts = []
+    for piece in _RUN_SPLIT_RE.split(text):
+        if not piece:
+            continue
+        if piece == '\t':
+            parts.append('<w:tab/>')
+        elif piece in ('\r', '\n'):
+            parts.append('<w:br/>')
+        elif len(piece.strip()) < len(piece):
+            parts.append(f'<w:t xml:space="preserve">{_escape(piece)}</w:t>')
+        else:
+            parts.append(f'<w:t>{_escape(piece)}</w:t>')
+    return ''.join(parts)
+
+
+def fragment_xml(element):
+    # 序列化脱离文档的元素，去掉标签中的命名空间声明（文本已转义，不会被误匹配）
+    xml = etree.tostring(element, encoding='unicode')
+    return _TAG_RE.sub(lambda m: _NSDECL_RE.sub('', m.group()), xml)
+
+
+def _iter_lines(text):
+    # 逐行切分大字符串，不生成完整的行列表
+    start = 0
+    while True:
+        end = text.find('\n', start)
+        if end == -1:
+            yield text[start:]
+            return
+        yield text[start:end]
+        start = end + 1
+
+
+class StreamingDocumentWriter:
+    """
+    流式文档写入：模板的其它部件原样复制，word/document.xml拆为模板头部与尾部，
+    内容到达时逐段生成段落XML直接写入zip条目，不构建python-docx对象树，
+    内存占用与单个分块成正比；输出的document.xml与create_document逐字节一致
+    Args:
+        templates: TemplateCache实例
+        font_name: 默认字体
+        compresslevel: zip压缩级别，见output.zip_options
+    """
+
+    def __init__(self, templates, font_name='微软雅黑', compresslevel=-1):
+        self.templates = templates
+        self.font_name = font_name
+        self.compresslevel = compresslevel
+
+    def _split_template(self, doc):
+        # 在create_paragraphs追加段落的位置（正文分节符之前）放置标记，序列化后按标记拆分
+        for section in doc.sections:
+            section.start_type = 4  # 与create_document一致
+        body = doc.element.body
+        marker = etree.Comment(uuid.uuid4().hex)
+        if body.sectPr is not None:
+            body.sectPr.addprevious(marker)
+        else:
+            body.append(marker)
+        xml = etree.tostring(doc.element, encoding='UTF-8', standalone=True)
+        head, tail = xml.split(etree.tostring(marker))
+        body.remove(marker)
+        return head, tail
+
+    def _paragraph_parts(self, formatter, bold, italic, line_formatter):
+        prototype = fragment_xml(formatter.build_paragraph_prototype(bold, italic, line_formatter))
+        suffix = '</w:r></w:p>'
+        if not prototype.endswith(suffix):
+            raise RuntimeError('段落原型结构异常')
+        return prototype[:-len(suffix)], suffix
+
+    def _styled_paragraph(self, doc, formatter, style_name, text, bold, italic):
+        # 带样式的段落（如标题）借助模板文档创建以解析样式，序列化后立即移除
+        p = formatter.create_paragraph(doc, text, bold=bold, italic=italic, style_name=style_name)._p
+        xml = fragment_xml(p)
+        p.getparent().remove(p)
+        return xml
+
+    def write(self, content, filename, bold=False, italic=False, template=None, spacing_enabled=False,
+              font_name=None, timings=None):
+        """
+        流式生成并保存文档，参数同AIDocWriter.create_document
+        Args:
+            content: 完整字符串，或段落/(样式名, 文本)元组的可迭代对象（可为流式生成器）
+            filename: 输出路径（直接写入，不做重名检测）或可写的二进制流
+            timings: 可选的字典，写入template_load与stream_write阶段耗时
+        Returns:
+            写入的段落数
+        """
+        timings = {} if timings is None else timings
+        start = time.perf_counter()
+        template_bytes = self.templates.prepared_bytes(template)
+        doc = Document(io.BytesIO(template_bytes))
+        head, tail = self._split_template(doc)
+        timings['template_load'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        formatter = DocumentFormatter(font_name=font_name or self.font_name)
+        prefix, suffix = self._paragraph_parts(formatter, bold, italic, LineFormatter(spacing_enabled=spacing_enabled))
+        paragraphs = _iter_lines(content) if isinstance(content, str) else content
+        count = 0
+
+        def paragraph_xml():
+            nonlocal count
+            for text in paragraphs:
+                style_name = None
+                if isinstance(text, tuple):
+                    style_name, text = text
+                if style_name:
+                    xml = self._styled_paragraph(doc, formatter, style_name, text, bold, italic)
+                else:
+                    xml = prefix + run_content_xml(text) + suffix
+                count += 1
+                yield xml.encode('utf-8')
+
+        try:
+            self._write_package(template_bytes, filename, head, tail, paragraph_xml(), self.compresslevel)
+        except BaseException:
+            # 写入中途失败时删除不完整的输出文件
+            if isinstance(filename, str) and os.path.exists(filename):
+                os.remove(filename)
+            raise
+        timings['stream_write'] = time.perf_counter() - start
+        return count
+
+    @staticmethod
+    def _write_package(template_bytes, filename, head, tail, fragments, compresslevel=-1):
+        # 模板的其它部件原样复制，document.xml按头部 + 段落片段 + 尾部分块写入
+        compression, level = zip_options(compresslevel)
+        with zipfile.ZipFile(io.BytesIO(template_bytes)) as source, \
+                zipfile.ZipFile(filename, 'w', compression=compression, compresslevel=level) as target:
+            for info in source.infolist():
+                if info.filename != DOCUMENT_PART:
+                    target.writestr(info.filename, source.read(info.filename))
+                    continue
+                with target.open(DOCUMENT_PART, 'w', force_zip64=True) as stream:
+                    stream.write(head)
+                    chunk, size = [], 0
+                    for data in fragments:
+                        chunk.append(data)
+                        size += len(data)
+                        if size >= FLUSH_BYTES:
+                            stream.write(b''.join(chunk))
+                            chunk, size = [], 0
+                    stream.write(b''.join(chunk))
+                    stream.write(tail)
@@ -0,0 +1,275 @@
+import json
+import random
+import sys
+import threading
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from client import estimate_tokens
+
+
+def parse_latency(spec):
+    """
+    解析延迟分布（单位秒）：'0.2'或'fixed:0.2'、'uniform:最小,最大'、'normal:均值,标准差'、
+    'lognormal:中位数,sigma'、'exp:均值'
+    Args:
+        spec: 分布描述字符串、数值，或接收random.Random返回秒数的函数
+    Returns:
+        接收random.Random返回秒数（不小于0）的函数
+    """
+    if callable(spec):
+        return spec
+    if not spec:
+        return lambda rng: 0.0
+    if isinstance(spec, (int, float)):
+        return lambda rng: float(spec)
+    kind, _, args = str(spec).partition(':')
+    if not args:
+        kind, args = 'fixed', kind
+    try:
+        values = [float(v) for v in args.split(',')]
+        samplers = {
+            'fixed': lambda rng: values[0],
+            'uniform': lambda rng: rng.uniform(values[0], values[1]),
+            'normal': lambda rng: rng.gauss(values[0], values[1]),
+            'lognormal': lambda rng: values[0] * rng.lognormvariate(0, values[1]),
+            'exp': lambda rng: rng.expovariate(1 / values[0]),
+        }
+        sampler = samplers[kind]
+        sampler(random.Random(0))
+    except (KeyError, ValueError, IndexError, ZeroDivisionError):
+        raise ValueError(f'无法解析的延迟分布: {spec}') from None
+    return lambda rng: max(0.0, sampler(rng))
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 客户端主动断开（取消、超时、对冲落败）属于预期情况，不打印堆栈
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class _CompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        # 桩服务默认不输出访问日志
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.send_error(404)
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        stub = self.server.stub
+        stub.requests.append(payload)
+        stub.record('requests')
+
+        # 响应头之前的延迟（首字节时间），之后按注入的故障或正常回复处理
+        fault = stub.pick_fault()
+        if fault:
+            stub.record(fault)
+        stub.sleep(stub.sample_latency())
+        if fault == 'timeout':
+            # 模拟服务端无响应：挂起后直接断开连接
+            stub.sleep(stub.timeout_seconds)
+            self.close_connection = True
+        elif fault == 'rate_limit':
+            self._send_error_status(429, 'rate_limit_exceeded', stub.retry_after)
+        elif fault == 'server_error':
+            self._send_error_status(503, 'server_error')
+        elif payload.get('stream'):
+            self._send_stream(stub, payload)
+        else:
+            self._send_json(stub, payload)
+
+    def _send_error_status(self, status, error_type, retry_after=None):
+        body = json.dumps({'error': {'message': f'stub injected {error_type}', 'type': error_type}}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if retry_after is not None:
+            self.send_header('Retry-After', str(retry_after))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, stub, payload):
+        content = stub.reply_for(payload)
+        completion_tokens = estimate_tokens(content)
+        # 非流式请求在生成完成后才返回，按token速率计入生成耗时
+        stub.sleep(stub.generation_time(completion_tokens))
+        body = json.dumps({
+            'id': 'stub-completion',
+            'object': 'chat.completion',
+            'model': payload.get('model'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop'
+            }],
+            'usage': {
+                'prompt_tokens': estimate_tokens(''.join(m.get('content', '') for m in payload.get('messages', []))),
+                'completion_tokens': completion_tokens,
+            }
+        }, ensure_ascii=False).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        stub.record('completed')
+
+    def _send_stream(self, stub, payload):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for piece in stub.iter_chunks(stub.reply_for(payload)):
+            event = {
+                'id': 'stub-completion',
+                'object': 'chat.completion.chunk',
+                'model': payload.get('model'),
+                'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}]
+            }
+            self._write_chunk(f'data: {json.dumps(event, ensure_ascii=False)}\n\n')
+            stub.sleep(stub.chunk_delay + stub.generation_time(estimate_tokens(piece)))
+        self._write_chunk('data: [DONE]\n\n')
+        self.wfile.write(b'0\r\n\r\n')
+        stub.record('completed')
+
+    def _write_chunk(self, text):
+        data = text.encode('utf-8')
+        self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+
+class StubCompletionServer:
+    """
+    本地OpenAI兼容的/chat/completions桩服务，用于离线测试与负载测试
+    Args:
+        content: 每次请求返回的完整内容，或接收请求体并返回内容的函数
+        chunk_size: 流式模式下每个SSE分片的字符数
+        chunk_delay: 流式模式下分片之间的间隔（秒）
+        latency: 响应头之前的延迟分布，格式见parse_latency
+        tokens_per_second: 模拟的生成速率（估算token/秒），0表示不限速
+        rate_limit_rate: 返回429的请求比例
+        server_error_rate: 返回503的请求比例
+        timeout_rate: 挂起timeout_seconds秒后断开连接的请求比例
+        timeout_seconds: 注入超时的挂起时长（秒）
+        retry_after: 429响应的Retry-After头（秒），为空时不返回
+        seed: 随机数种子，用于复现延迟与故障序列
+        keep_requests: requests中保留的最近请求体数量，0表示不记录（长时间负载测试）；请求计数见stats
+    """
+
+    def __init__(self, content, host='127.0.0.1', port=0, chunk_size=16, chunk_delay=0.0, latency=None,
+                 tokens_per_second=0.0, rate_limit_rate=0.0, server_error_rate=0.0, timeout_rate=0.0,
+                 timeout_seconds=30.0, retry_after=None, seed=None, keep_requests=1000):
+        self.content = content
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.latency = parse_latency(latency)
+        self.tokens_per_second = tokens_per_second
+        self.faults = [('rate_limit', rate_limit_rate), ('server_error', server_error_rate),
+                       ('timeout', timeout_rate)]
+        self.timeout_seconds = timeout_seconds
+        self.retry_after = retry_after
+        self.requests = deque(maxlen=keep_requests)
+        self.stats = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._server = _StubHTTPServer((host, port), _CompletionHandler)
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def api_base(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def reply_for(self, payload):
+        # content可为固定文本，或根据请求体返回文本的函数
+        return self.content(payload) if callable(self.content) else self.content
+
+    def record(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def pick_fault(self):
+        # 按各故障比例抽样，返回故障名或None
+        with self._lock:
+            roll = self._rng.random()
+        for name, rate in self.faults:
+            if roll < rate:
+                return name
+            roll -= rate
+        return None
+
+    def sample_latency(self):
+        with self._lock:
+            return self.latency(self._rng)
+
+    def generation_time(self, tokens):
+        return tokens / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def sleep(self, seconds):
+        # 服务停止时立即结束等待
+        if seconds > 0:
+            self._stopped.wait(seconds)
+
+    def iter_chunks(self, content):
+        for i in range(0, len(content), self.chunk_size):
+            yield content[i:i + self.chunk_size]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._stopped.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='本地/chat/completions桩服务')
+    parser.add_argument('content_file', help='作为回复内容的文本文件')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--chunk-size', type=int, default=16)
+    parser.add_argument('--chunk-delay', type=float, default=0.0)
+    parser.add_argument('--latency', help='首字节延迟分布，如0.2、uniform:0.1,0.5、lognormal:0.3,0.5')
+    parser.add_argument('--tokens-per-second', type=float, default=0.0, help='模拟生成速率，0表示不限速')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='返回429的请求比例')
+    parser.add_argument('--server-error-rate', type=float, default=0.0, help='返回503的请求比例')
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help='挂起后断开连接的请求比例')
+    parser.add_argument('--timeout-seconds', type=float, default=30.0)
+    parser.add_argument('--retry-after', type=float, help='429响应的Retry-After（秒）')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    with open(args.content_file, encoding='utf-8') as f:
+        server = StubCompletionServer(
+            f.read(), port=args.port, chunk_size=args.chunk_size, chunk_delay=args.chunk_delay,
+            latency=args.latency, tokens_per_second=args.tokens_per_second,
+            rate_limit_rate=args.rate_limit_rate, server_error_rate=args.server_error_rate,
+            timeout_rate=args.timeout_rate, timeout_seconds=args.timeout_seconds,
+            retry_after=args.retry_after, seed=args.seed, keep_requests=0,
+        )
+    print(f'桩服务已启动: {server.api_base}')
+    server.serve_forever()
@@ -0,0 +1,277 @@
+import copy
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from docx import Document
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.text.paragraph import Paragraph
+from lxml import etree
+
+from line import LineFormatter
+
+
+W_P, W_R, W_T = qn('w:p'), qn('w:r'), qn('w:t')
+W_TBL, W_TR, W_TC = qn('w:tbl'), qn('w:tr'), qn('w:tc')
+W_BODY, W_PPR, W_SECTPR, W_PBDR = qn('w:body'), qn('w:pPr'), qn('w:sectPr'), qn('w:pBdr')
+
+
+def _pPr_prototype(apply):
+    # 在空段落上执行一次LineFormatter，取其生成的pPr子元素作为克隆原型
+    paragraph = Paragraph(OxmlElement('w:p'), None)
+    apply(paragraph)
+    return tuple(paragraph._p.get_or_add_pPr())
+
+
+class TemplateNormalizer:
+    """
+    单次遍历的模板规范化引擎：一次遍历document.xml收集正文段落、正文表格单元格、
+    分节符与边框元素，随后逐个修改，替代doc.paragraphs/table.rows/cells/sections/XPath的多次遍历
+    规则：
+        decorative_lines: 移除正文段落pPr与单元格tcPr中的段落边框（pBdr）
+        symbol_border: 含触发符号的正文段落添加右侧与底部边框
+        spacing: 正文段落添加底部分割线、全宽缩进与段前段后间距
+        section_type: 分节符类型统一设为section_type
+        strip_borders: 移除所有名称含"Bdr"的XML元素
+    Args:
+        rules: 启用的规则名序列，默认全部启用
+        symbols: 触发边框的符号
+        section_type: 分节符类型，为空时不修改
+    """
+
+    RULES = ('decorative_lines', 'symbol_border', 'spacing', 'section_type', 'strip_borders')
+
+    def __init__(self, rules=RULES, symbols=':', section_type='continuous'):
+        unknown = set(rules) - set(self.RULES)
+        if unknown:
+            raise ValueError(f'未知的模板规范化规则: {", ".join(sorted(unknown))}')
+        self.rules = tuple(rule for rule in self.RULES if rule in rules)
+        self.symbols = symbols
+        self.section_type = section_type if 'section_type' in self.rules else None
+
+        line_formatter = LineFormatter(spacing_enabled=True)
+        self._symbol_border = ()
+        if 'symbol_border' in self.rules and symbols:
+            self._symbol_border = _pPr_prototype(lambda p: line_formatter.add_symbol_triggered_border(p, ':'))
+        self._spacing = ()
+        if 'spacing' in self.rules:
+            self._spacing = _pPr_prototype(line_formatter.set_spacing_property)
+
+    @classmethod
+    def from_config(cls, config):
+        section = 'Template'
+        rules = config.get(section, 'normalize_rules', fallback=','.join(cls.RULES))
+        return cls(
+            rules=[rule.strip() for rule in rules.split(',') if rule.strip()],
+            symbols=config.get(section, 'border_symbols', fallback=':'),
+            section_type=config.get(section, 'section_type', fallback='continuous') or None,
+        )
+
+    @property
+    def key(self):
+        # 参与模板缓存键，规则变化时重新预处理
+        return self.rules, self.symbols, self.section_type
+
+    def _has_symbol(self, p):
+        # 与Paragraph.text一致：只检查段落直接子级w:r中的w:t文本
+        for run in p.iterchildren(W_R):
+            for t in run.iterchildren(W_T):
+                if t.text and any(symbol in t.text for symbol in self.symbols):
+                    return True
+        return False
+
+    def normalize(self, doc):
+        """
+        原地规范化文档，效果与逐段落/逐单元格/逐分节处理后再以XPath清理边框一致
+        Args:
+            doc: python-docx文档对象
+        Returns:
+            移除的XML元素数
+        """
+        rules = self.rules
+        touch_paragraphs = 'decorative_lines' in rules or self._symbol_border or self._spacing
+        strip_borders = 'strip_borders' in rules
+
+        # 单次遍历收集目标元素，遍历结束后再修改，避免边遍历边改树
+        paragraphs, cells, sections, borders = [], [], [], []
+        for element in doc.element.iter(etree.Element):
+            tag = element.tag
+            if tag == W_P:
+                if touch_paragraphs and element.getparent().tag == W_BODY:
+                    paragraphs.append(element)
+            elif tag == W_TC:
+                if 'decorative_lines' in rules:
+                    table = element.getparent().getparent()
+                    if table.tag == W_TBL and table.getparent().tag == W_BODY:
+                        cells.append(element)
+            elif tag == W_SECTPR:
+                if self.section_type:
+                    parent = element.getparent()
+                    if parent.tag == W_BODY or (parent.tag == W_PPR and parent.getparent().getparent().tag == W_BODY):
+                        sections.append(element)
+            elif strip_borders and 'Bdr' in tag.rpartition('}')[2]:
+                borders.append(element)
+
+        removed = 0
+        for p in paragraphs:
+            pPr = p.get_or_add_pPr()
+            if 'decorative_lines' in rules:
+                pBdr = pPr.find(W_PBDR)
+                if pBdr is not None:
+                    pPr.remove(pBdr)
+                    removed += 1
+            if self._symbol_border and self._has_symbol(p):
+                for child in self._symbol_border:
+                    pPr.append(copy.deepcopy(child))
+            for child in self._spacing:
+                pPr.append(copy.deepcopy(child))
+
+        for tc in cells:
+            tcPr = tc.get_or_add_tcPr()
+            pBdr = tcPr.find(W_PBDR)
+            if pBdr is not None:
+                tcPr.remove(pBdr)
+                removed += 1
+
+        for sectPr in sections:
+            sectPr.get_or_add_type().set(qn('w:val'), self.section_type)
+
+        for element in borders:
+            # 已随decorative_lines移除的pBdr不再重复计数
+            parent = element.getparent()
+            if parent is not None:
+                parent.remove(element)
+                removed += 1
+        return removed
+
+
+def prepare_template(doc, normalizer=None):
+    """
+    规范化模板文档：清理装饰线、添加符号触发边框、分节符设为连续并清除残留边框元素
+    Args:
+        doc: python-docx文档对象，原地修改
+        normalizer: TemplateNormalizer实例，为空时启用全部默认规则
+    Returns:
+        移除的XML元素数
+    """
+    try:
+        return (normalizer or TemplateNormalizer()).normalize(doc)
+    except Exception as e:
+        print(f"文档处理异常: {type(e).__name__} - {str(e)}\n发生位置: {e.__traceback__.tb_lineno if e.__traceback__ else '未知'}")
+        raise RuntimeError("文档生成失败，请检查模板格式") from e
+
+
+class TemplateCache:
+    """
+    预处理模板缓存：每个(模板路径, 修改时间, 选项)只规范化一次，之后从缓存的字节副本打开新文档
+    Args:
+        cache_dir: 预处理后.docx的落盘目录，为空时仅缓存在内存
+        max_items: 内存中保留的模板数量
+        metrics: 可选的Metrics实例，记录预处理耗时与移除的XML元素数
+        normalizer: TemplateNormalizer实例，为空时启用全部默认规则
+    """
+
+    def __init__(self, cache_dir=None, max_items=16, metrics=None, normalizer=None):
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self.metrics = metrics
+        self.normalizer = normalizer or TemplateNormalizer()
+        self._prepared = OrderedDict()
+        self._locks = {}
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config, metrics=None):
+        section = 'Template'
+        return cls(
+            cache_dir=config.get(section, 'cache_dir', fallback='') or None,
+            max_items=config.getint(section, 'max_items', fallback=16),
+            metrics=metrics,
+            normalizer=TemplateNormalizer.from_config(config),
+        )
+
+    @staticmethod
+    def make_key(template=None, **options):
+        if template:
+            stat = os.stat(template)
+            source = (os.path.abspath(template), stat.st_mtime_ns, stat.st_size)
+        else:
+            source = ('', 0, 0)
+        return source + tuple(sorted(options.items()))
+
+    def _disk_path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f'{digest}.docx')
+
+    def prepared_bytes(self, template=None, **options):
+        """
+        返回规范化后模板的.docx字节内容，首次调用时执行预处理
+        Args:
+            template: 模板路径，为空时使用python-docx默认模板
+        Returns:
+            .docx字节内容
+        """
+        key = self.make_key(template, normalize=self.normalizer.key, **options)
+        with self._lock:
+            data = self._prepared.get(key)
+            if data is not None:
+                self._prepared.move_to_end(key)
+                return data
+            key_lock = self._locks.setdefault(key, threading.Lock())
+
+        # 同一模板只由一个线程预处理，其余线程等待结果
+        with key_lock:
+            with self._lock:
+                data = self._prepared.get(key)
+            if data is None:
+                data = self._load(key, template)
+            with self._lock:
+                self._prepared[key] = data
+                self._prepared.move_to_end(key)
+                while len(self._prepared) > self.max_items:
+                    self._prepared.popitem(last=False)
+                self._locks.pop(key, None)
+        return data
+
+    def _load(self, key, template):
+        disk_path = self._disk_path(key) if self.cache_dir else None
+        if disk_path and os.path.exists(disk_path):
+            with open(disk_path, 'rb') as f:
+                return f.read()
+
+        start = time.perf_counter()
+        doc = Document(template) if template else Document()
+        removed = prepare_template(doc, self.normalizer)
+        if self.metrics is not None:
+            self.metrics.observe('template_prepare', time.perf_counter() - start)
+            self.metrics.incr('xml_elements_removed', removed)
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        data = buffer.getvalue()
+
+        if disk_path:
+            tmp_path = f'{disk_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, disk_path)
+        return data
+
+    def open(self, template=None, **options):
+        """
+        打开一份规范化模板的独立副本
+        Args:
+            template: 模板路径，为空时使用python-docx默认模板
+        Returns:
+            可自由修改的python-docx文档对象
+        """
+        return Document(io.BytesIO(self.prepared_bytes(template, **options)))
+
+    def clear(self):
+        with self._lock:
+            self._prepared.clear()
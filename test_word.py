@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+from word import ContentFilter
+
+CASES = [
+    'a\n\n/\n\nb\n  －－ \nc',
+    '第一段\n**\n\n\n/\n第二段\n',
+    '/\n\n/\n\n正文',
+    '正文\n\n\n',
+    '**要点**：内容\n  *  \n`代码`\n# 标题',
+]
+
+
+def _chunks(text, rng):
+    # 按随机长度切分，模拟SSE增量
+    chunks, start = [], 0
+    while start < len(text):
+        end = start + rng.randint(1, 5)
+        chunks.append(text[start:end])
+        start = end
+    return chunks
+
+
+@pytest.mark.parametrize('rule_set', ['default', 'markdown', 'none'])
+@pytest.mark.parametrize('text', CASES)
+def test_stream_matches_bulk(rule_set, text):
+    content_filter = ContentFilter.get(rule_set)
+    expected = content_filter.filter(text).split('\n')
+    assert list(content_filter.filter_stream([text])) == expected
+    rng = random.Random(0)
+    for _ in range(20):
+        assert list(content_filter.filter_stream(_chunks(text, rng))) == expected
+
+
+@pytest.mark.parametrize('rule_set', ['default', 'markdown'])
+def test_stream_matches_bulk_random(rule_set):
+    content_filter = ContentFilter.get(rule_set)
+    rng = random.Random(1)
+    tokens = ['正文', 'a', '/', '*', '**', '－', ' ', '  ', '\n', '\n', '\n', '`', '# ']
+    for _ in range(2000):
+        text = ''.join(rng.choice(tokens) for _ in range(rng.randint(1, 30)))
+        expected = content_filter.filter(text).split('\n')
+        assert list(content_filter.filter_stream(_chunks(text, rng))) == expected, repr(text)
+
+
+def test_empty_stream_yields_nothing():
+    assert list(ContentFilter.get('default').filter_stream([])) == []
+    assert list(ContentFilter.get('default').filter_stream(['', ''])) == []
@@ -1,6 +1,142 @@
+import logging
 import re
 
+logger = logging.getLogger(__name__)
+
+
+class FilterRule:
+    """
+    内容过滤规则，正则统一以MULTILINE模式编译（^/$匹配行首行尾）
+    Args:
+        name: 规则名
+        pattern: 正则表达式
+        whole_line: True时整行匹配则将该行置空，False时删除行内匹配片段
+        triggers: 触发字符，文本中不含任何触发字符时跳过该规则，为空表示总是执行
+    """
+
+    def __init__(self, name, pattern, whole_line=False, triggers=''):
+        self.name = name
+        self.pattern = pattern
+        self.whole_line = whole_line
+        self.triggers = triggers
+
+
+DEFAULT_RULES = (
+    # 删除连续双星号
+    FilterRule('double_asterisk', r'\*{2,}', triggers='*'),
+    # 仅移除含*/符号的行
+    FilterRule('symbol_line', r'\s*[\*/－]+\s*', whole_line=True, triggers='*/－'),
+)
+
+MARKDOWN_RULES = DEFAULT_RULES + (
+    FilterRule('heading_marks', r'^#{1,6}[ \t]+', triggers='#'),
+    FilterRule('backticks', r'`+', triggers='`'),
+)
+
+
 class ContentFilter:
+    """
+    可配置的内容过滤引擎：规则预编译，相邻行内规则合并为单次扫描；
+    文本不含规则的触发字符时跳过该规则，均未触发时直接返回原字符串，不产生拷贝
+    Args:
+        rules: FilterRule序列
+    """
+
+    RULE_SETS = {
+        'default': DEFAULT_RULES,
+        'markdown': MARKDOWN_RULES,
+        'none': (),
+    }
+    _instances = {}
+
+    def __init__(self, rules=DEFAULT_RULES):
+        self.rules = tuple(rules)
+        # 按规则顺序编译扫描步骤，相邻的行内规则合并为一个正则
+        self._passes = []
+        for rule in self.rules:
+            if rule.whole_line:
+                self._passes.append((re.compile(f'^(?:{rule.pattern})$', re.MULTILINE), True, rule.triggers))
+            elif self._passes and not self._passes[-1][1]:
+                regex, _, triggers = self._passes[-1]
+                merged = re.compile(f'{regex.pattern}|(?:{rule.pattern})', re.MULTILINE)
+                self._passes[-1] = (merged, False, triggers + rule.triggers if triggers and rule.triggers else '')
+            else:
+                self._passes.append((re.compile(f'(?:{rule.pattern})', re.MULTILINE), False, rule.triggers))
+
+    @classmethod
+    def register_rule_set(cls, name, rules):
+        cls.RULE_SETS[name] = tuple(rules)
+        cls._instances.pop(name, None)
+
+    @classmethod
+    def get(cls, rule_set='default'):
+        """
+        获取指定规则集的共享过滤器实例
+        """
+        instance = cls._instances.get(rule_set)
+        if instance is None:
+            if rule_set not in cls.RULE_SETS:
+                raise ValueError(f'未知的过滤规则集: {rule_set}')
+            instance = cls._instances[rule_set] = cls(cls.RULE_SETS[rule_set])
+        return instance
+
+    @staticmethod
+    def _triggered(triggers, text):
+        return not triggers or any(c in text for c in triggers)
+
+    def filter(self, text):
+        """
+        过滤整段文本，只执行文本中出现触发字符的规则；无规则命中时返回原字符串
+        Args:
+            text: 需要过滤的文本
+        Returns:
+            过滤后的文本
+        """
+        result = text
+        for regex, _, triggers in self._passes:
+            if self._triggered(triggers, result):
+                result = regex.sub('', result)
+        if result is not text and logger.isEnabledFor(logging.DEBUG):
+            logger.debug('[预处理] 原始内容:\n%s\n%s', text, '-' * 40)
+            logger.debug('[处理后] 最终内容:\n%s\n%s', result, '=' * 40)
+        return result
+
+    def clean_line(self, line):
+        """
+        过滤单行文本（不含换行符），整行规则匹配时返回空字符串
+        """
+        for regex, whole_line, triggers in self._passes:
+            if not self._triggered(triggers, line):
+                continue
+            if whole_line:
+                if regex.fullmatch(line):
+                    return ''
+            else:
+                line = regex.sub('', line)
+        return line
+
+    def stream(self):
+        """
+        创建增量过滤器，用于流式输出，结果与filter()处理完整文本后按行拆分一致
+        """
+        return StreamFilter(self)
+
+    def filter_stream(self, chunks):
+        """
+        过滤流式文本片段并逐行产出，结果与对拼接后的完整文本执行filter()再按行拆分一致
+        """
+        stream = self.stream()
+        for chunk in chunks:
+            yield from stream.feed(chunk)
+        yield from stream.close()
+
+    def filter_lines(self, lines):
+        """
+        逐行过滤可迭代对象，适用于分块/流式输出
+        """
+        for line in lines:
+            yield self.clean_line(line)
+
     @staticmethod
     def filter_ai_symbols(text):
         """
@@ -10,10 +146,68 @@ class ContentFilter:
         Returns:
             过滤后的文本
         """
-        # 使用正则表达式移除*和-及其后续空格
-        text = re.sub(r'\*{2,}', '', text)  # 删除连续双星号
-        print(f'[预处理] 原始内容:\n{text}\n{"-"*40}')
-        # 优化符号行过滤仅移除含*/符号的行
-        result = re.sub(r'^\s*[\*/－]+\s*$', '', text, flags=re.MULTILINE)
-        print(f'[处理后] 最终内容:\n{result}\n{"="*40}')
-        return result
\ No newline at end of file
+        return ContentFilter.get('default').filter(text)
+
+    @staticmethod
+    def filter_line(line):
+        """
+        逐行过滤AI回复中的特殊符号（用于流式输出）
+        Args:
+            line: 单行文本，不含换行符
+        Returns:
+            过滤后的文本
+        """
+        return ContentFilter.get('default').clean_line(line)
+
+
+class StreamFilter:
+    """
+    流式文本的增量过滤器：整行规则以MULTILINE正则作用于完整文本时，其中的空白匹配可跨越换行，
+    符号行会连同相邻的空白行合并为一个空行，逐行clean_line无法复现；
+    因此过滤后为空白的行先暂存，遇到过滤后非空白的行（整行规则不会跨越该行）或结束时，
+    再以filter()整体处理暂存的行
+    Args:
+        content_filter: ContentFilter实例
+    """
+
+    def __init__(self, content_filter):
+        self.content_filter = content_filter
+        self._buffer = ''
+        self._pending = []
+        self._received = False
+
+    def _flush(self):
+        lines = self.content_filter.filter('\n'.join(self._pending)).split('\n')
+        self._pending = []
+        return lines
+
+    def feed(self, chunk):
+        """
+        输入一段文本，返回已可确定的过滤后行列表（不含换行符）
+        """
+        self._received = self._received or bool(chunk)
+        self._buffer += chunk
+        if '\n' not in self._buffer:
+            return []
+        *lines, self._buffer = self._buffer.split('\n')
+        output = []
+        for line in lines:
+            cleaned = self.content_filter.clean_line(line)
+            if cleaned.strip():
+                if self._pending:
+                    output.extend(self._flush())
+                output.append(cleaned)
+            else:
+                self._pending.append(line)
+        return output
+
+    def close(self):
+        """
+        输入结束，返回剩余的过滤后行（末尾的空行同样返回，与按行拆分完整文本一致）；
+        未收到任何内容时返回空列表，调用方据此判断回复为空
+        """
+        if not self._received:
+            return []
+        self._pending.append(self._buffer)
+        self._buffer = ''
+        return self._flush()
@@ -0,0 +1,289 @@
+import io
+import os
+import threading
+import time
+from configparser import ConfigParser
+
+from coalesce import RequestCoalescer
+from metrics import Metrics, Profiler
+from word import ContentFilter
+
+
+class _lazy:
+    """
+    首次访问时才创建并缓存的属性，多线程同时首次访问时只创建一次；
+    可直接赋值覆盖（如替换client）
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.name = factory.__name__
+        self.__doc__ = factory.__doc__
+
+    def __get__(self, obj, owner):
+        if obj is None:
+            return self
+        with obj._lazy_lock:
+            if self.name not in obj.__dict__:
+                obj.__dict__[self.name] = self.factory(obj)
+        return obj.__dict__[self.name]
+
+
+class AIDocWriter:
+    """
+    无界面依赖的文档生成核心：配置在首次使用时读取，
+    python-docx/lxml与requests等重依赖在首次构建文档或发出请求时才导入，
+    使只需部分功能的工作进程与命令行工具能快速启动
+    Args:
+        config_path: 配置文件路径
+    """
+
+    def __init__(self, config_path='config.ini'):
+        self.config_path = config_path
+        self._lazy_lock = threading.RLock()
+        # 各阶段计时与计数，cProfile采样由config.ini的[Metrics]节开启
+        self.metrics = Metrics()
+
+    @_lazy
+    def config(self):
+        config = ConfigParser()
+        config.read(self.config_path)
+        return config
+
+    @_lazy
+    def api_key(self):
+        return self.config.get('API', 'api_key')
+
+    @_lazy
+    def model(self):
+        return self.config.get('API', 'model_name')
+
+    @_lazy
+    def api_base(self):
+        return self.config.get('API', 'api_base')
+
+    @_lazy
+    def font_name(self):
+        return self.config.get('Style', 'font_name', fallback='微软雅黑')
+
+    @_lazy
+    def font_size(self):
+        return self.config.getint('Style', 'font_size', fallback=12)
+
+    @_lazy
+    def profiler(self):
+        return Profiler() if self.config.getboolean('Metrics', 'profile', fallback=False) else None
+
+    @_lazy
+    def profile_output(self):
+        return self.config.get('Metrics', 'profile_output', fallback='profile.prof')
+
+    @_lazy
+    def filter_rule_set(self):
+        # 默认过滤规则集，可在config.ini的[Filter]节修改
+        return self.config.get('Filter', 'rule_set', fallback='default')
+
+    @_lazy
+    def client(self):
+        # 复用连接池的补全客户端，超时/重试/限流参数见config.ini的[Client]节；
+        # 配置了[Backend:*]节时改用多后端路由，参数见[Router]节
+        from router import ModelRouter
+        if ModelRouter.configured(self.config):
+            return ModelRouter.from_config(self.config, self.api_key, self.model, metrics=self.metrics)
+        from client import CompletionClient
+        return CompletionClient.from_config(self.config, self.api_base, self.api_key, metrics=self.metrics)
+
+    @_lazy
+    def cache(self):
+        # 相同请求的回复缓存，参数见config.ini的[Cache]节
+        from cache import ResponseCache
+        return ResponseCache.from_config(self.config)
+
+    @_lazy
+    def coalescer(self):
+        # 提示词规范化、进行中请求合并与近似重复复用，参数见config.ini的[Coalesce]节
+        return RequestCoalescer.from_config(self.config, metrics=self.metrics)
+
+    @_lazy
+    def templates(self):
+        # 预处理模板缓存，参数见config.ini的[Template]节
+        from template import TemplateCache
+        return TemplateCache.from_config(self.config, metrics=self.metrics)
+
+    @_lazy
+    def stream_writer(self):
+        # 大文档的流式写入器，create_document(streaming=True)时使用
+        from streamdoc import StreamingDocumentWriter
+        return StreamingDocumentWriter(self.templates, font_name=self.font_name,
+                                       compresslevel=self.output.compresslevel)
+
+    @_lazy
+    def output(self):
+        # 文档输出：原子预留文件名、压缩级别与后台写盘，参数见config.ini的[Output]节
+        from output import OutputWriter
+        return OutputWriter.from_config(self.config, metrics=self.metrics)
+
+    def create_document(self, content, filename, font_name=None, font_size=None, bold=False, italic=False, template=None, spacing_enabled=False, streaming=False, reserved=False):
+        # filename为路径时由self.output原子预留不冲突的文件名；为可写二进制流（如io.BytesIO）时直接写入；
+        # reserved为True表示filename已由output.reserve()预留（如续跑的队列任务），直接替换该文件
+        timings = {}
+        template = template if template and os.path.exists(template) else None
+
+        if streaming:
+            # 流式写入：段落XML直接写入zip，内存占用与单个分块成正比，不经过后台写盘
+            count = 0
+
+            def render(stream):
+                nonlocal count
+                count = self.stream_writer.write(content, stream, bold=bold, italic=italic, template=template,
+                                                 spacing_enabled=spacing_enabled, font_name=font_name,
+                                                 timings=timings)
+            filename, size = self.output.write(filename, render, background=False, reserved=reserved)
+        else:
+            from formatting import DocumentFormatter
+            from line import LineFormatter
+
+            start = time.perf_counter()
+            # 从预处理模板缓存打开独立副本，同一模板只做一次规范化
+            doc = self.templates.open(template)
+            timings['template_load'] = time.perf_counter() - start
+
+            # 使用主文档的格式化器实例
+            formatter = DocumentFormatter(
+                font_name=font_name or self.font_name,
+                font_size=DocumentFormatter.configure_font(font_size) if font_size else self.font_size
+            )
+
+            # 在文档末尾添加新内容（content可为完整字符串或流式段落迭代器）
+            paragraphs = content.split('\n') if isinstance(content, str) else content
+            line_formatter = LineFormatter(spacing_enabled=spacing_enabled)
+            # 批量构建：字体与间隔线片段只构建一次，逐段克隆
+            start = time.perf_counter()
+            count = formatter.create_paragraphs(doc, paragraphs, bold=bold, italic=italic, line_formatter=line_formatter)
+            timings['paragraph_build'] = time.perf_counter() - start
+
+            # 统一清理所有分节符
+            for section in doc.sections:
+                section.start_type = 4  # 4对应CONTINUOUS类型
+
+            start = time.perf_counter()
+            filename, size = self.output.save(doc, filename, reserved=reserved)
+            timings['save'] = time.perf_counter() - start
+
+        for stage, seconds in timings.items():
+            self.metrics.observe(stage, seconds)
+        self.metrics.incr('paragraphs_built', count)
+        self.metrics.incr('bytes_written', size)
+        in_memory = not isinstance(filename, str)
+        self.metrics.emit('document', filename='<memory>' if in_memory else filename,
+                          paragraphs=count, bytes=size, **timings)
+        if not in_memory:
+            print(f"文档已保存至：{os.path.abspath(filename)}")
+        return filename
+
+    def create_document_bytes(self, content, **kwargs):
+        """
+        在内存中生成文档并返回.docx字节内容，不写磁盘（如作为服务接口的响应），参数同create_document
+        """
+        buffer = io.BytesIO()
+        self.create_document(content, buffer, **kwargs)
+        return buffer.getvalue()
+
+    def _build_payload(self, prompt):
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0.7
+        }
+
+    def _cache_key(self, payload):
+        # 按规范化后的提示词计算缓存键与合并键，空白与全半角差异不影响命中；发给模型的仍是原始提示词
+        messages = [dict(message, content=self.coalescer.normalize(message['content']))
+                    for message in payload['messages']]
+        return self.cache.make_key(payload['model'], messages, payload['temperature'], self.api_base)
+
+    def _coalesce_scope(self, payload):
+        # 近似重复只在相同模型、温度与接口之间复用
+        return payload['model'], payload['temperature'], self.api_base
+
+    def _fetch(self, key, payload):
+        content = self.client.chat(payload)
+        self.cache.set(key, content)
+        return content
+
+    def get_filter(self, rule_set=None):
+        return ContentFilter.get(rule_set or self.filter_rule_set)
+
+    def generate_content(self, prompt, use_cache=True, rule_set=None, use_similar=True):
+        # use_similar为False时不复用近似重复提示词的回复（仍可命中精确缓存），
+        # 用于模板化、彼此只差少量文字的提示词，如长文档的大纲与各章节
+        payload = self._build_payload(prompt)
+
+        try:
+            key = self._cache_key(payload)
+            content = self.cache.get(key) if use_cache else None
+            if content is None:
+                # 相同的进行中请求只发出一次，近似重复的提示词可复用已有回复
+                content = self.coalescer.fetch(key, self.coalescer.normalize(prompt),
+                                               lambda: self._fetch(key, payload),
+                                               scope=self._coalesce_scope(payload),
+                                               use_similar=use_cache and use_similar)
+            else:
+                self.metrics.incr('cache_hits')
+            with self.metrics.stage('filter'):
+                filtered_content = self.get_filter(rule_set).filter(content)
+            return filtered_content
+        except Exception as e:
+            print(f"API请求失败: {e}")
+            return None
+
+    def generate_content_stream(self, prompt, use_cache=True, rule_set=None, on_response=None, use_similar=True):
+        """
+        以SSE流式方式请求内容，按段落逐个产出
+        请求在调用时立即发出，返回的生成器可直接传给create_document，
+        使模板处理与模型生成重叠进行
+        Args:
+            prompt: 文档主题
+            use_cache: 是否读取回复缓存，命中时不发出请求
+            rule_set: 过滤规则集名，为空时使用配置中的默认规则集
+            on_response: 可选回调，收到响应头后以Response调用，供其它线程中止读取
+            use_similar: 是否复用近似重复提示词的回复，同generate_content
+        Returns:
+            生成器，每次产出一个过滤后的段落
+        """
+        payload = self._build_payload(prompt)
+        content_filter = self.get_filter(rule_set)
+        key = self._cache_key(payload)
+        prompt = self.coalescer.normalize(prompt)
+        scope = self._coalesce_scope(payload)
+        content = None
+        if use_cache:
+            content = self.cache.get(key)
+            if content is None and use_similar:
+                content = self.coalescer.similar(prompt, scope)
+        if content is not None:
+            return self._iter_stream_paragraphs([content], content_filter)
+
+        try:
+            response = self.client.open_stream(payload)
+        except Exception as e:
+            print(f"API请求失败: {e}")
+            raise RuntimeError("流式请求失败，请检查API配置") from e
+        if on_response is not None:
+            on_response(response)
+        deltas = self.client.iter_stream(response)
+        return self._iter_stream_paragraphs(self._record_stream(key, deltas, prompt, scope), content_filter)
+
+    def _record_stream(self, key, deltas, prompt, scope):
+        # 流完整结束后才写入缓存，中途中断的回复不缓存
+        completion = []
+        for delta in deltas:
+            completion.append(delta)
+            yield delta
+        content = ''.join(completion)
+        self.cache.set(key, content)
+        self.coalescer.remember(prompt, content, scope)
+
+    def _iter_stream_paragraphs(self, deltas, content_filter):
+        # 增量过滤，段落与非流式路径filter()后按行拆分的结果一致
+        return content_filter.filter_stream(deltas)